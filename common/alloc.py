@@ -13,6 +13,14 @@ def env_step(env, action_train_agent, action_use_agent, train_agent_name):
     reward_train_agent, reward_use_agent = alloc_reward(reward_b, reward_r,train_agent_name)
     return next_state_train_agent, next_state_use_agent, reward_train_agent, done
 
+def memory_state(env, state_train_agent, train_agent_name):
+    '''
+    存入经验池的状态：经验池保存原始位姿时（env.flag_pose）为训练智能体视角的位姿，否则为状态本身
+    '''
+    if env.flag_pose:
+        return env.pose[0 if train_agent_name == 'blue' else 1]
+    return state_train_agent
+
 def alloc_state(state_blue, state_red, train_agent_name):
     if train_agent_name == 'blue':
         state_train_agent = state_blue
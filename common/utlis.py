@@ -64,6 +64,17 @@ def judge_type(arg):
     else:
         raise Exception("Invalid type! %s"%str(type(arg)), arg)
 
+def str2list(arg):
+    """
+    将配置中的列表参数统一转换为字符串列表
+    （args_wrapper_parser 会把 yaml 中的列表解析成 "['a', 'b']" 形式的字符串）
+    例如："default" -> ['default']；"[default, overload]" -> ['default', 'overload']
+    """
+    if isinstance(arg, (list, tuple)):
+        return [str(x) for x in arg]
+    return [x.strip().strip("'\"") for x in str(arg).strip().strip('[]').split(',') if x.strip()]
+
+
 def random_two_range(x1, y1, x2, y2):
     """
     param:
@@ -2,9 +2,11 @@
 # -*- coding: utf-8 -*-
 from envs.airCombateEnv.airCombateEnv import *
 from envs.landingGuidanceEnv.guidneceEnv import GuidenceEnvOverload
+from envs.vecEnv import SubprocVecEnv
 
 REGISTRY = {}
 REGISTRY["airCombate"] = AirCombatEnv
+REGISTRY["vecAirCombate"] = VecAirCombatEnv
 REGISTRY["airCombateNvsM"] = AirCombatEnvMultiUnit
 REGISTRY["guidence"] = GuidenceEnvOverload
 
@@ -7,10 +7,15 @@ import time
 import sys
 
 sys.path.append('../..')
-from envs.airCombateEnv.customization import init_posture
+from envs.airCombateEnv.customization import init_posture, init_posture_batch, init_formation, get_pose
 from envs.airCombateEnv.customization import REGISTRY_STATE as registry_state
+from envs.airCombateEnv.customization import REGISTRY_STATE_BATCH as registry_state_batch
+from envs.airCombateEnv import kernels
+from envs.airCombateEnv.spatialHash import SpatialHashGrid, k_nearest
 from argument.argManage import args
 from envs.unit import REGISTRY as registry_unit
+from envs.unit import AircraftFleet
+from common.utlis import str2list
 
 if sys.version_info.major == 2:
     import Tkinter as tk
@@ -122,13 +127,19 @@ class AirCombatEnv(Env):
         self.Dis_max = 500  # 距离最大值
         self.Dis_min = 100  # 距离最小值
         self.adv_count = 0  # 持续建立优势的次数
+        self.engagement_params = dict(aa_range=self.AA_range, ata_range=self.ATA_range,
+                                      dis_max=self.Dis_max, dis_min=self.Dis_min)
         # 初始想定模式：0随机，1进攻，2防御，3同向，4中立
         self.init_scen = args.init_scen
         # 强化学习动作接口
         self.action_space = ['l', 's', 'r']  # 向左滚转、维持滚转、向右滚转
         self.n_actions = len(self.action_space)
         self.action_dim = self.n_actions
-        self.state_dim = len(registry_state[args.state_setting](self.red, self.blue, self.adv_count))
+        self.state_fn = registry_state[args.state_setting]  # 状态函数在构造时确定
+        self.state_dim = len(self.state_fn(self.red, self.blue, self.adv_count))
+        # 经验池保存原始位姿时（memory_type: pose），每次计算状态时同时记录 self.pose（见 customization.get_pose）
+        self.flag_pose = args.memory_type == "pose"
+        self.pose = None
         # reward条件
         self.success = 0
 
@@ -149,26 +160,19 @@ class AirCombatEnv(Env):
         self.blue.oil = args.Sum_Oil
         # print(self.red.ac_pos)
         # print(self.blue.ac_pos)
-        # 计算ATA，AA
-        self.ATA_b, self.AA_b = self._getAngle(self.red.ac_pos, self.blue.ac_pos, self.red.ac_heading,
-                                               self.blue.ac_heading)
-        self.ATA_r, self.AA_r = self._getAngle(self.blue.ac_pos, self.red.ac_pos, self.blue.ac_heading,
-                                               self.red.ac_heading)
-        # 计算距离
-        dis = self._get_dis(self.red.ac_pos, self.blue.ac_pos)
-        # 计算优势
-        self.adv_count = self._calculate_Advantages(self.adv_count, dis, self.AA_r, self.ATA_r, self.AA_b, self.ATA_b)
-        # reward shaping
-        RA_b = 1 - ((1 - math.fabs(self.ATA_b) / 180) + (1 - math.fabs(self.AA_b) / 180))
-        RA_r = 1 - ((1 - math.fabs(self.ATA_r) / 180) + (1 - math.fabs(self.AA_r) / 180))
-        RD = math.exp(-(math.fabs(dis - ((self.Dis_max + self.Dis_min) / 2)) / 180 * 0.1))
-        Rbl_b = RA_b * RD
-        Rbl_r = RA_r * RD
-        self.fai_b = -0.01 * Rbl_b
-        self.fai_r = -0.01 * Rbl_r
+        # 计算ATA，AA，距离，优势以及 reward shaping 的势函数
+        eng = kernels.engagement_reset(self.red.ac_pos, self.red.ac_heading, self.blue.ac_pos,
+                                       self.blue.ac_heading, **self.engagement_params)
+        self.ATA_b, self.AA_b, self.ATA_r, self.AA_r = eng.ATA_b, eng.AA_b, eng.ATA_r, eng.AA_r
+        self.adv_count = eng.adv_count
+        self.advs.append(self.adv_count)
+        self.fai_b = eng.fai_b
+        self.fai_r = eng.fai_r
         # 返回红蓝飞机状态
-        s_b = registry_state[args.state_setting](self.red, self.blue, self.adv_count)
-        s_r = registry_state[args.state_setting](self.blue, self.red, self.adv_count)
+        s_b = self.state_fn(self.red, self.blue, self.adv_count)
+        s_r = self.state_fn(self.blue, self.red, self.adv_count)
+        if self.flag_pose:
+            self.pose = get_pose(self.red, self.blue, self.adv_count)
         return s_b, s_r
 
     def step_selfPlay(self, action_b, action_r):
@@ -180,9 +184,11 @@ class AirCombatEnv(Env):
         self.red.move(action_r)
         # print(self.red.ac_pos)
         # print(self.blue.ac_pos)
-        # 返回红蓝飞机状态
-        s_b = registry_state[args.state_setting](self.red, self.blue, self.adv_count)
-        s_r = registry_state[args.state_setting](self.blue, self.red, self.adv_count)
+        # 返回红蓝飞机状态（状态会被经验池保存，每步新建数组）
+        s_b = self.state_fn(self.red, self.blue, self.adv_count)
+        s_r = self.state_fn(self.blue, self.red, self.adv_count)
+        if self.flag_pose:
+            self.pose = get_pose(self.red, self.blue, self.adv_count)
         # 计算reward
         self.reward_b, self.reward_r, self.done, self.adv_count = self._get_reward(self.red.ac_pos, self.red.ac_heading,
                                                                                    self.blue.ac_pos,
@@ -204,78 +210,25 @@ class AirCombatEnv(Env):
             分别输入两架飞机的位置坐标 和 朝向角，
             计算 第二架飞机B的 ATA 和 AA 角（见doc/pic/envs_airCombateEnv_001.png）
         """
-        theta_br = 180 * math.atan2((agent_A_pos[1] - agent_B_pos[1]), (agent_A_pos[0] - agent_B_pos[0])) / math.pi
-        theta_rb = 180 * math.atan2((agent_B_pos[1] - agent_A_pos[1]), (agent_B_pos[0] - agent_A_pos[0])) / math.pi
-        if theta_br < 0:
-            theta_br = 360 + theta_br
-        if theta_rb < 0:
-            theta_rb = 360 + theta_rb
-        ATA = agent_B_heading - theta_br
-        AA = 180 + agent_A_heading - theta_rb
-        if ATA > 180:
-            ATA = 360 - ATA
-        elif ATA < -180:
-            ATA = 360 + ATA
-        if AA > 180:
-            AA = 360 - AA
-        elif AA < -180:
-            AA = 360 + AA
-        return ATA, AA
+        ATA, AA = kernels.get_angles(agent_A_pos, agent_A_heading, agent_B_pos, agent_B_heading)[:2]
+        return float(ATA), float(AA)
 
     def _get_reward(self, ac_pos_r, ac_heading_r, ac_pos_b, ac_heading_b, adv_count):
-        dis = math.sqrt((ac_pos_r[0] - ac_pos_b[0]) * (ac_pos_r[0] - ac_pos_b[0])
-                        + (ac_pos_r[1] - ac_pos_b[1]) * (ac_pos_r[1] - ac_pos_b[1]))
-        # 计算ATA和AA
-        self.ATA_b, self.AA_b = self._getAngle(ac_pos_r, ac_pos_b, ac_heading_r, ac_heading_b)
-        self.ATA_r, self.AA_r = self._getAngle(ac_pos_b, ac_pos_r, ac_heading_b, ac_heading_r)
-        # 计算优势
-        adv_count = self._calculate_Advantages(adv_count, dis, self.AA_r, self.ATA_r, self.AA_b, self.ATA_b)
-        # reward shaping
-        RA_b = 1 - ((1 - math.fabs(self.ATA_b) / 180) + (1 - math.fabs(self.AA_b) / 180))
-        RA_r = 1 - ((1 - math.fabs(self.ATA_r) / 180) + (1 - math.fabs(self.AA_r) / 180))
-        RD = math.exp(-(math.fabs(dis - ((self.Dis_max + self.Dis_min) / 2)) / 180 * 0.1))
-        Rbl_b = RA_b * RD
-        Rbl_r = RA_r * RD
+        '''
+        使用 kernels.engagement_step 一次计算 ATA/AA、距离、优势次数、势函数、reward 和 done
+        '''
+        eng = kernels.engagement_step(ac_pos_r, ac_heading_r, ac_pos_b, ac_heading_b, adv_count,
+                                      self.fai_b, self.fai_r, self.red.oil, self.blue.oil, args.map_area,
+                                      **self.engagement_params)
+        self.ATA_b, self.AA_b, self.ATA_r, self.AA_r = eng.ATA_b, eng.AA_b, eng.ATA_r, eng.AA_r
+        self.advs.append(eng.adv_count)
         self.old_fai_b = self.fai_b
         self.old_fai_r = self.fai_r
-        self.fai_b = -0.01 * Rbl_b
-        self.fai_r = -0.01 * Rbl_r
-        # 计算reward和终止条件
-        # print(adv_count)
-        if adv_count >= 9:
-            done = True
-            self.success = 1
-            reward_b = 2.0
-            reward_r = -2.0
-            # print("bsuccess")
-        elif adv_count <= -9:
-            done = True
-            self.success = -1
-            reward_b = -2.0
-            reward_r = 2.0
-            # print("rsuccess")
-        elif self.red.oil <= 0 and self.blue.oil <= 0:
-            done = True
-            self.success = 0
-            reward_b = -1.0
-            reward_r = -1.0
-        elif (ac_pos_b[0] > args.map_area) or ((0 - ac_pos_b[0]) > args.map_area) or \
-                (ac_pos_b[1] > args.map_area) or ((0 - ac_pos_b[1]) > args.map_area):
-            done = True
-            self.success = 0
-            reward_b = -1.0
-            reward_r = (self.fai_r - self.old_fai_r) - 0.001
-        elif (ac_pos_r[0] > args.map_area) or ((0 - ac_pos_r[0]) > args.map_area) or \
-                (ac_pos_r[1] > args.map_area) or ((0 - ac_pos_r[1]) > args.map_area):
-            done = True
-            self.success = 0
-            reward_b = (self.fai_b - self.old_fai_b) - 0.001
-            reward_r = -1.0
-        else:
-            done = False
-            reward_b = (self.fai_b - self.old_fai_b) - 0.001
-            reward_r = (self.fai_r - self.old_fai_r) - 0.001
-        return reward_b, reward_r, done, adv_count
+        self.fai_b = eng.fai_b
+        self.fai_r = eng.fai_r
+        if eng.done:
+            self.success = eng.success
+        return eng.reward_b, eng.reward_r, eng.done, eng.adv_count
 
     def _calculate_Advantages(self, adv_count, dis, AA_r, ATA_r, AA_b, ATA_b):
         """
@@ -288,21 +241,8 @@ class AirCombatEnv(Env):
         :param ATA_b:蓝方ATA角
         :return:优势次数
         """
-        # 计算优势
-        if (dis < self.Dis_max) and (dis > self.Dis_min) \
-                and (abs(AA_b) < self.AA_range) and (abs(ATA_b) < self.ATA_range):
-            if adv_count >= 0:  # 如果之前蓝方已经是优势态势，优势累加
-                adv_count += 1
-            else:  # 如果之前是红方优势态势，优势交替
-                adv_count = 1
-        elif (dis < self.Dis_max) and (dis > self.Dis_min) \
-                and (abs(AA_r) < self.AA_range) and (abs(ATA_r) < self.ATA_range):
-            if adv_count <= 0:
-                adv_count -= 1
-            else:
-                adv_count = -1
-        else:
-            adv_count = 0
+        adv_count = int(kernels.update_adv_count(adv_count, dis, AA_r, ATA_r, AA_b, ATA_b,
+                                                 **self.engagement_params))
         self.advs.append(adv_count)
         return adv_count
 
@@ -356,78 +296,430 @@ class AirCombatEnv(Env):
         return pos_show
 
 
-class AirCombatEnvMultiUnit(Env):
-    def __init__(self):
-        super(AirCombatEnv, self).__init__()
+class VecAirCombatEnv(Env):
+    '''
+    向量化的1v1空战环境：同时推演 n_envs 局红蓝对抗。
+        所有局的 坐标、朝向角、滚转角、油量、adv_count 均保存在连续的 numpy 数组中，
+        reset_selfPlay / step_selfPlay 的输入输出均为批量形式（第一维为环境序号）；
+        某局结束(done)后在同一次 step_selfPlay 内自动重置该局，
+        返回的状态即新一局的初始状态，结束时刻的状态保存在 terminal_s_b / terminal_s_r 中。
+    与 AirCombatEnv 的区别：
+        重置时滚转角归零（AirCombatEnv 中滚转角会沿用上一局的值）。
+    '''
+    def __init__(self, n_envs=None):
+        super(VecAirCombatEnv, self).__init__()
+        self.n_envs = args.n_envs if n_envs is None else n_envs
+        # reward判断指标
+        self.AA_range = 60  # 视界角范围
+        self.ATA_range = 30  # 天线拂擦角范围
+        self.Dis_max = 500  # 距离最大值
+        self.Dis_min = 100  # 距离最小值
+        self.engagement_params = dict(aa_range=self.AA_range, ata_range=self.ATA_range,
+                                      dis_max=self.Dis_max, dis_min=self.Dis_min)
+        # 初始想定模式：0随机，1进攻，2防御，3同向，4中立
+        self.init_scen = args.init_scen
+        # 强化学习动作接口
+        self.action_space = ['l', 's', 'r']  # 向左滚转、维持滚转、向右滚转
+        self.n_actions = len(self.action_space)
+        self.action_dim = self.n_actions
+        self.get_state_batch = registry_state_batch[args.state_setting]
+
+        # 飞机参数（与 AircraftDefault(None, 200, 80) 一致）
+        # 红方在 fleet 的前 n 行，蓝方在后 n 行，双方飞机一次性推演
+        n = self.n_envs
+        self.fleet = AircraftFleet(2 * n, 200, 80)
+        self.red_pos, self.blue_pos = self.fleet.pos[:n], self.fleet.pos[n:]
+        self.red_heading, self.blue_heading = self.fleet.heading[:n], self.fleet.heading[n:]
+        self.red_bank_angle, self.blue_bank_angle = self.fleet.bank_angle[:n], self.fleet.bank_angle[n:]
+        self.red_oil, self.blue_oil = self.fleet.oil[:n], self.fleet.oil[n:]
+        self.adv_count = np.zeros(n, dtype=np.int64)
+        self.fai_b = np.zeros(n)
+        self.fai_r = np.zeros(n)
+        self.ATA_b = np.full(n, 100.0)
+        self.AA_b = np.full(n, 100.0)
+        self.ATA_r = np.full(n, 100.0)
+        self.AA_r = np.full(n, 100.0)
+        self.done = np.zeros(n, dtype=bool)
+        self.success = np.zeros(n, dtype=np.int64)
+
+        self.state_dim = self._get_states(np.arange(1))[0].shape[1]
+        # 两组状态缓存交替使用：本步返回的状态在下一步仍然有效（作为 s 与 next_s 配对），再下一步被覆盖
+        self.state_buffer = np.empty((2, 2, n, self.state_dim))
+        self.state_buffer_id = 0
 
-        # 初始化双方飞机
-        id_number = 0
-        for name in args.red_unit_type_list:  # args.red_unit_type_list为飞机类型名字列表
-            red_unit = registry_unit[name](id_number)
-            self.red_unit_list.append(red_unit)
-            id_number = id_number + 1
+    def reset_selfPlay(self):
+        '''
+        重置全部 n_envs 局
+        输出：
+            蓝方状态(n_envs, state_dim)，红方状态(n_envs, state_dim)
+        '''
+        self.done[:] = False
+        self.success[:] = 0
+        self._reset_envs(np.arange(self.n_envs))
+        return self._get_states(out=self._next_state_buffer())
 
-        id_number = 0
-        for name in args.blue_unit_type_list:
-            blue_unit = registry_unit[name](id_number)
-            self.blue_unit_list.append(blue_unit)
-            id_number = id_number + 1
+    def step_selfPlay(self, action_b, action_r):
+        '''
+        Params:
+            action_b:   蓝方动作(n_envs,)
+            action_r:   红方动作(n_envs,)
+        return:
+            s_b, s_r, reward_b, reward_r, done，均为第一维为 n_envs 的数组
+        主要逻辑：
+            与 AirCombatEnv.step_selfPlay 相同（状态使用更新前的 adv_count），
+            done 的环境在返回前自动重置。
+        '''
+        # 执行动作
+        self.fleet.move(np.concatenate((action_r, action_b)))
+        # 返回红蓝飞机状态
+        s_b, s_r = self._get_states(out=self._next_state_buffer())
+        # 计算reward
+        reward_b, reward_r, done = self._get_reward()
+        self.done = done
+        # 自动重置结束的环境
+        self.terminal_s_b = s_b
+        self.terminal_s_r = s_r
+        done_idx = np.flatnonzero(done)
+        if len(done_idx):
+            self.terminal_s_b = s_b.copy()
+            self.terminal_s_r = s_r.copy()
+            self._reset_envs(done_idx)
+            s_b[done_idx], s_r[done_idx] = self._get_states(done_idx)
+        return s_b, s_r, reward_b, reward_r, done
+
+    def _reset_envs(self, idx):
+        '''
+        重置 idx 对应的环境，包括初始化姿态、油量、优势次数及 reward shaping 的势函数
+        '''
+        n = len(idx)
+        red_pos, red_heading, blue_pos, blue_heading = \
+            init_posture_batch(self.init_scen, n, args.random_r, args.random_b)
+        self.red_pos[idx] = red_pos
+        self.red_heading[idx] = red_heading
+        self.red_bank_angle[idx] = 0
+        self.red_oil[idx] = args.Sum_Oil
+        self.blue_pos[idx] = blue_pos
+        self.blue_heading[idx] = blue_heading
+        self.blue_bank_angle[idx] = 0
+        self.blue_oil[idx] = args.Sum_Oil
+        # 计算ATA，AA，距离，优势以及 reward shaping 的势函数
+        eng = kernels.engagement_reset(red_pos, red_heading, blue_pos, blue_heading, **self.engagement_params)
+        self.adv_count[idx] = eng.adv_count
+        self.fai_b[idx] = eng.fai_b
+        self.fai_r[idx] = eng.fai_r
+
+    def _get_states(self, idx=slice(None), out=None):
+        '''
+        一次计算 idx 对应环境中蓝方和红方的状态，写入 out(2, n, state_dim)（为 None 时新建）
+        '''
+        out = self.get_state_batch(self.red_pos[idx], self.red_heading[idx], self.red_bank_angle[idx],
+                                   self.blue_pos[idx], self.blue_heading[idx], self.blue_bank_angle[idx],
+                                   self.adv_count[idx], out=out)
+        return out[0], out[1]
 
-        self.n_red_unit = len(args.red_unit_type_list)
-        self.n_blue_unit = len(args.blue_unit_type_list)
+    def _next_state_buffer(self):
+        self.state_buffer_id ^= 1
+        return self.state_buffer[self.state_buffer_id]
 
-        # 强化学习动作接口
-        # 【方案一】 直接使用联结动作空间，即 [a1, a2, ..., an, a1, a2, ..., an, ...]
-        # 注意：如果红蓝双方飞机数量不一致，则分别定义
-        self.single_action_space = ['l', 's', 'r']  # 向左滚转、维持滚转、向右滚转
-        self.action_space = self.single_action_space * self.n_red_unit
-        # # 【方案二】 使用decentralized policy，即动作空间只包含单独一个agent的
-        # self.action_space = ['l', 's', 'r']
+    def _get_reward(self):
+        '''
+        使用 kernels.engagement_step 批量计算 reward 和 done，同时更新 adv_count、ATA/AA、势函数和 success
+        '''
+        eng = kernels.engagement_step(self.red_pos, self.red_heading, self.blue_pos, self.blue_heading,
+                                      self.adv_count, self.fai_b, self.fai_r, self.red_oil, self.blue_oil,
+                                      args.map_area, **self.engagement_params)
+        self.ATA_b, self.AA_b, self.ATA_r, self.AA_r = eng.ATA_b, eng.AA_b, eng.ATA_r, eng.AA_r
+        self.adv_count = eng.adv_count
+        self.fai_b, self.fai_r = eng.fai_b, eng.fai_r
+        self.success = eng.success
+        return eng.reward_b, eng.reward_r, eng.done
 
+
+class AirCombatEnvMultiUnit(Env):
+    '''
+    N v M 空战环境：红方 n_red_unit 架、蓝方 n_blue_unit 架 AircraftDefault。
+        双方飞机保存在同一个 AircraftFleet 中（红方在前 n_red_unit 行，蓝方在后），一次 move 推演全部飞机；
+        ATA/AA、距离通过广播一次算出 (n_red_unit, n_blue_unit) 的两两矩阵，
+        每一对飞机维护一个优势次数 adv_count[i, j]（正数为蓝方 j 对红方 i 的优势，负数为红方 i 对蓝方 j 的优势）。
+    规则：
+        adv_count[i, j] >= 9 时红方 i 被击落，蓝方 j 奖励 +2，红方 i 奖励 -2（红方同理）；
+        飞出地图的飞机视为损失，奖励 -1；其余存活飞机的奖励为 reward shaping（对所有存活敌机势函数的最大值）；
+        一方全部损失或油量耗尽时 done，success：1 蓝方胜，-1 红方胜，0 平局。
+    观测 args.multi_obs：
+        agent:  每架飞机一个观测，s_b 为 (n_blue_unit, state_dim_b)，reward_b 为 (n_blue_unit,)
+        joint:  联结观测，s_b 为全部蓝方观测拼接成的一维向量，reward_b 为蓝方奖励之和
+    大规模对抗 args.spatial_grid = 1：
+        使用 SpatialHashGrid 只对相邻网格内（可能小于 Dis_max）的飞机对计算优势和势函数，
+        势函数只在候选敌机中取最大值（没有候选敌机时为 0）；
+        观测改为 args.obs_k_nearest 架最近的敌机和友机（需 obs_k_nearest > 0）。
+    '''
+    def __init__(self):
+        super(AirCombatEnvMultiUnit, self).__init__()
+        # reward判断指标
+        self.AA_range = 60  # 视界角范围
+        self.ATA_range = 30  # 天线拂擦角范围
+        self.Dis_max = 500  # 距离最大值
+        self.Dis_min = 100  # 距离最小值
+        self.engagement_params = dict(aa_range=self.AA_range, ata_range=self.ATA_range,
+                                      dis_max=self.Dis_max, dis_min=self.Dis_min)
+        # 初始想定模式：0随机，1进攻，2防御，3同向，4中立
+        self.init_scen = args.init_scen
+        self.formation_spacing = args.formation_spacing
+        self.multi_obs = args.multi_obs
+        if self.multi_obs not in ('agent', 'joint'):
+            raise Exception("multi_obs error")
+        self.spatial_grid = args.spatial_grid
+        self.obs_k_nearest = args.obs_k_nearest
+        if self.spatial_grid and self.obs_k_nearest <= 0:
+            raise Exception("spatial_grid requires obs_k_nearest > 0")
+
+        # 初始化双方飞机，类型列表只有一个名字时全部飞机使用该类型
+        self.n_red_unit = args.n_red_unit
+        self.n_blue_unit = args.n_blue_unit
+        red_types = self._unit_types(args.red_unit_type_list, self.n_red_unit)
+        blue_types = self._unit_types(args.blue_unit_type_list, self.n_blue_unit)
+        if set(red_types + blue_types) != {"default"}:
+            raise Exception("AirCombatEnvMultiUnit only supports default unit")
+        n_r, n_b = self.n_red_unit, self.n_blue_unit
+        self.fleet = AircraftFleet(n_r + n_b, 200, 80)
+        self.red_pos, self.blue_pos = self.fleet.pos[:n_r], self.fleet.pos[n_r:]
+        self.red_heading, self.blue_heading = self.fleet.heading[:n_r], self.fleet.heading[n_r:]
+        self.red_bank_angle, self.blue_bank_angle = self.fleet.bank_angle[:n_r], self.fleet.bank_angle[n_r:]
+        self.red_unit_list = [self.fleet.aircraft(i) for i in range(n_r)]
+        self.blue_unit_list = [self.fleet.aircraft(n_r + i) for i in range(n_b)]
+        self.red_alive = np.ones(n_r, dtype=bool)
+        self.blue_alive = np.ones(n_b, dtype=bool)
+        self.adv_count = np.zeros((n_r, n_b), dtype=np.int64)
+        self.fai_b = np.zeros(n_b)
+        self.fai_r = np.zeros(n_r)
+        if self.spatial_grid:
+            self.red_grid = SpatialHashGrid(args.map_area, self.Dis_max)
+            self.blue_grid = SpatialHashGrid(args.map_area, self.Dis_max)
+
+        # 强化学习动作接口：每架飞机独立选择动作，step_selfPlay 输入各方的动作列表
+        self.single_action_space = ['l', 's', 'r']  # 向左滚转、维持滚转、向右滚转
+        self.action_space = self.single_action_space
         self.action_dim = self.n_actions = len(self.action_space)
-        self.state_dim = 5  # 需要定义
+        # 单架飞机的观测维度：自身 5 + 每架敌机 7 + 每架友机 4
+        if self.obs_k_nearest > 0:
+            self.state_dim_b = self.state_dim_r = 5 + 11 * self.obs_k_nearest
+        else:
+            self.state_dim_b = 5 + 7 * n_r + 4 * (n_b - 1)
+            self.state_dim_r = 5 + 7 * n_b + 4 * (n_r - 1)
+        if self.multi_obs == 'joint':
+            self.state_dim_b *= n_b
+            self.state_dim_r *= n_r
+        self.state_dim = self.state_dim_b
+        self.done = False
+        self.success = 0
 
-        # todo：reward判断指标
+    @staticmethod
+    def _unit_types(type_list, n):
+        types = str2list(type_list)
+        if len(types) == 1:
+            types = types * n
+        if len(types) != n:
+            raise Exception("unit_type_list length error")
+        return types
 
     def reset_selfPlay(self):
         self.done = False
         self.success = 0
-        self.acts = [[], []]  # todo-levin: 只保存一个agent的acts，还是两个acgent的acts？
-
-        # 1°初始化红蓝红方飞机
-        # todo:
-        # 【方案一】：
-        # 按照实际阵型构建初始化阵型函数，初始化中心飞机的位置，确定每个飞机的位置
-        # 【方案二】：
-        # 随机初始化一个区域，在区域内随机初始各飞机的位置
-
-        # 遍历列表初始化飞机的状态：滚转角、油量等
-
-        # 2°得到初始状态
-        for unit in self.red_unit_list:
-            # 分别得到红、蓝双方的联结状态空间
-            pass
-        for unit in self.blue_unit_list:
-            pass
+        self.acts = [[], []]
+        self.red_alive[:] = True
+        self.blue_alive[:] = True
+        # 初始化红蓝方编队
+        self.red_pos[:], self.red_heading[:], self.blue_pos[:], self.blue_heading[:] = \
+            init_formation(self.init_scen, self.n_red_unit, self.n_blue_unit, args.random_r, args.random_b,
+                           self.formation_spacing)
+        self.fleet.bank_angle[:] = 0
+        self.fleet.oil[:] = args.Sum_Oil
+        # 计算两两之间的ATA，AA，距离，优势以及势函数
+        self.adv_count[:] = 0
+        self._update_engagement()
+        self._update_potential()
+        return self._get_obs()
 
-    # levin - [done]： add both actions
     def step_selfPlay(self, action_blue_list, action_red_list):
         '''
         Parms:
-            action_b: list or tuple
-            action_r: list or tuple
+            action_blue_list:   蓝方各飞机动作，长度 n_blue_unit
+            action_red_list:    红方各飞机动作，长度 n_red_unit
+        return:
+            s_b, s_r, reward_b, reward_r, done
         '''
-        # 1° 双方飞机移动
-        self._unit_move(self.blue_unit_list, action_blue_list)
-        self._unit_move(self.red_unit_list, action_red_list)
-
-    # 2° todo：得到联结状态空间
-    # 3° todo：得到奖励值和done
+        self.acts[0].append(action_blue_list)
+        self.acts[1].append(action_red_list)
+        # 1° 双方飞机移动（已损失的飞机同样推演，但不参与观测和奖励）
+        self.fleet.move(np.concatenate((np.asarray(action_red_list), np.asarray(action_blue_list))))
+        red_alive, blue_alive = self.red_alive.copy(), self.blue_alive.copy()
+        fai_b, fai_r = self.fai_b, self.fai_r
+        # 2° 两两交战矩阵：优势次数、击落
+        self._update_engagement()
+        red_killed = (self.adv_count >= 9).any(axis=1)
+        blue_killed = (self.adv_count <= -9).any(axis=0)
+        blue_kills = (self.adv_count >= 9).sum(axis=0)
+        red_kills = (self.adv_count <= -9).sum(axis=1)
+        # 飞出地图
+        red_out = red_alive & ~red_killed & (np.abs(self.red_pos).max(axis=1) > args.map_area)
+        blue_out = blue_alive & ~blue_killed & (np.abs(self.blue_pos).max(axis=1) > args.map_area)
+        self.red_alive &= ~(red_killed | red_out)
+        self.blue_alive &= ~(blue_killed | blue_out)
+        # 3° 奖励：被击落 -2，出界 -1，否则 reward shaping；击落敌机 +2
+        self._update_potential()
+        reward_b = np.where(blue_killed, -2.0, np.where(blue_out, -1.0, (self.fai_b - fai_b) - 0.001))
+        reward_r = np.where(red_killed, -2.0, np.where(red_out, -1.0, (self.fai_r - fai_r) - 0.001))
+        reward_b = np.where(blue_alive, reward_b + 2.0 * blue_kills, 0.0)
+        reward_r = np.where(red_alive, reward_r + 2.0 * red_kills, 0.0)
+        # 4° 终止条件
+        no_oil = self.fleet.oil.max() <= 0
+        if not self.red_alive.any() or not self.blue_alive.any() or no_oil:
+            self.done = True
+            self.success = int(self.blue_alive.any() and not self.red_alive.any()) - \
+                int(self.red_alive.any() and not self.blue_alive.any())
+            if no_oil:
+                reward_b = np.where(self.blue_alive, -1.0, reward_b)
+                reward_r = np.where(self.red_alive, -1.0, reward_r)
+        s_b, s_r = self._get_obs()
+        if self.multi_obs == 'joint':
+            return s_b, s_r, reward_b.sum(), reward_r.sum(), self.done
+        return s_b, s_r, reward_b, reward_r, self.done
+
+    def _update_engagement(self):
+        '''
+        计算存活飞机对的 ATA/AA、距离，并更新每一对的优势次数
+            spatial_grid = 0：广播计算 (n_red_unit, n_blue_unit) 的两两矩阵
+            spatial_grid = 1：只计算 SpatialHashGrid 给出的候选飞机对，其余飞机对的优势次数归零
+        候选飞机对及其几何量保存在 self.pairs 中，供势函数和 k 近邻观测使用
+        '''
+        if self.spatial_grid:
+            self.blue_grid.update(self.blue_pos, self.blue_alive)
+            ri, bj = self.blue_grid.query(self.red_pos, self.red_alive)
+            ATA_b, AA_b, ATA_r, AA_r, dis = kernels.get_angles(self.red_pos[ri], self.red_heading[ri],
+                                                               self.blue_pos[bj], self.blue_heading[bj])
+        else:
+            self.ATA_b, self.AA_b, self.ATA_r, self.AA_r, self.dis = kernels.get_angles(
+                self.red_pos[:, None, :], self.red_heading[:, None], self.blue_pos[None, :, :],
+                self.blue_heading[None, :])
+            ri, bj = np.nonzero(self.red_alive[:, None] & self.blue_alive[None, :])
+            ATA_b, AA_b, ATA_r, AA_r, dis = self.ATA_b[ri, bj], self.AA_b[ri, bj], self.ATA_r[ri, bj], \
+                self.AA_r[ri, bj], self.dis[ri, bj]
+        adv_count = np.zeros_like(self.adv_count)
+        adv_count[ri, bj] = kernels.update_adv_count(self.adv_count[ri, bj], dis, AA_r, ATA_r, AA_b, ATA_b,
+                                                     **self.engagement_params)
+        self.adv_count = adv_count
+        self.pairs = (ri, bj, ATA_b, AA_b, ATA_r, AA_r, dis)
+
+    def _update_potential(self):
+        '''
+        每架飞机的势函数取其对所有存活（候选）敌机势函数的最大值，没有存活敌机时为 0
+        '''
+        ri, bj, ATA_b, AA_b, ATA_r, AA_r, dis = self.pairs
+        live = self.red_alive[ri] & self.blue_alive[bj]
+        fai_b, fai_r = kernels.get_potential(dis[live], ATA_b[live], AA_b[live], ATA_r[live], AA_r[live],
+                                             self.Dis_max, self.Dis_min)
+        self.fai_b = np.full(self.n_blue_unit, -np.inf)
+        self.fai_r = np.full(self.n_red_unit, -np.inf)
+        np.maximum.at(self.fai_b, bj[live], fai_b)
+        np.maximum.at(self.fai_r, ri[live], fai_r)
+        self.fai_b[~np.isfinite(self.fai_b)] = 0
+        self.fai_r[~np.isfinite(self.fai_r)] = 0
+
+    def _get_obs(self):
+        s_b = self.get_agent_obs('blue')
+        s_r = self.get_agent_obs('red')
+        if self.multi_obs == 'joint':
+            return s_b.reshape(-1), s_r.reshape(-1)
+        return s_b, s_r
 
-    def _unit_move(self, unit_list, action_list):
-        # todo：判断unit_list和action_list的维度匹配
-        for unit, action in zip(unit_list, action_list):
-            unit.move(action)
+    def get_agent_obs(self, side):
+        '''
+        param:
+            side:   'blue' 或 'red'
+        return:
+            该方每架飞机的观测 (n, state_dim)，已损失的飞机观测全为 0
+        主要逻辑：
+            自身：坐标、朝向角、滚转角、是否存活
+            每架敌机：相对坐标、朝向角、自身对其的ATA和AA、优势次数（正数为自身优势）、是否存活
+            每架友机：相对坐标、朝向角、是否存活
+            obs_k_nearest > 0 时只保留距离最近的 k 架敌机和 k 架友机（按距离排序，不足 k 架时补 0）
+        '''
+        if side == 'blue':
+            pos, heading, bank, alive = self.blue_pos, self.blue_heading, self.blue_bank_angle, self.blue_alive
+            e_pos, e_heading, e_alive = self.red_pos, self.red_heading, self.red_alive
+        elif side == 'red':
+            pos, heading, bank, alive = self.red_pos, self.red_heading, self.red_bank_angle, self.red_alive
+            e_pos, e_heading, e_alive = self.blue_pos, self.blue_heading, self.blue_alive
+        else:
+            raise Exception("side error")
+        n, m = len(pos), len(e_pos)
+        own = np.column_stack((pos / args.map_area, heading / 180, bank / 80, alive))
+        if self.obs_k_nearest > 0:
+            enemy, mate = self._get_knn_obs(side, pos, heading, alive, e_pos, e_heading)
+        else:
+            if side == 'blue':
+                ATA, AA, adv = self.ATA_b.T, self.AA_b.T, self.adv_count.T
+            else:
+                ATA, AA, adv = self.ATA_r, self.AA_r, -self.adv_count
+            enemy = np.empty((n, m, 7))
+            enemy[:, :, 0:2] = (e_pos[None, :, :] - pos[:, None, :]) / args.map_area
+            enemy[:, :, 2] = e_heading[None, :] / 180
+            enemy[:, :, 3] = ATA / 180
+            enemy[:, :, 4] = AA / 180
+            enemy[:, :, 5] = adv / 10
+            enemy[:, :, 6] = e_alive[None, :]
+            enemy *= e_alive[None, :, None]
+            mate = np.empty((n, n, 4))
+            mate[:, :, 0:2] = (pos[None, :, :] - pos[:, None, :]) / args.map_area
+            mate[:, :, 2] = heading[None, :] / 180
+            mate[:, :, 3] = alive[None, :]
+            mate *= alive[None, :, None]
+            mate = mate[~np.eye(n, dtype=bool)].reshape(n, n - 1, 4)
+        obs = np.concatenate((own, enemy.reshape(n, -1), mate.reshape(n, -1)), axis=1)
+        obs *= alive[:, None]
+        return obs
+
+    def _get_knn_obs(self, side, pos, heading, alive, e_pos, e_heading):
+        '''
+        return:
+            最近 k 架敌机的观测 (n, k, 7)，最近 k 架友机的观测 (n, k, 4)
+        主要逻辑：
+            敌机候选取自 self.pairs（spatial_grid = 1 时即相邻网格内的飞机对），
+            友机候选取自本方网格（spatial_grid = 0 时为全部友机），用 k_nearest 按距离排序后散射到固定的 k 个位置
+        '''
+        n, k = len(pos), self.obs_k_nearest
+        ri, bj, ATA_b, AA_b, ATA_r, AA_r, dis = self.pairs
+        live = self.red_alive[ri] & self.blue_alive[bj]
+        if side == 'blue':
+            agent, target, ATA, AA, adv = bj[live], ri[live], ATA_b[live], AA_b[live], self.adv_count[ri, bj][live]
+        else:
+            agent, target, ATA, AA, adv = ri[live], bj[live], ATA_r[live], AA_r[live], -self.adv_count[ri, bj][live]
+        sel, rank = k_nearest(agent, dis[live], k)
+        a, t = agent[sel], target[sel]
+        enemy = np.zeros((n, k, 7))
+        enemy[a, rank, 0:2] = (e_pos[t] - pos[a]) / args.map_area
+        enemy[a, rank, 2] = e_heading[t] / 180
+        enemy[a, rank, 3] = ATA[sel] / 180
+        enemy[a, rank, 4] = AA[sel] / 180
+        enemy[a, rank, 5] = adv[sel] / 10
+        enemy[a, rank, 6] = 1
+
+        if self.spatial_grid:
+            grid = self.blue_grid if side == 'blue' else self.red_grid
+            grid.update(pos, alive)
+            qi, ti = grid.query(pos, alive)
+        else:
+            qi, ti = np.nonzero(alive[:, None] & alive[None, :])
+        other = qi != ti
+        qi, ti = qi[other], ti[other]
+        rel = pos[ti] - pos[qi]
+        sel, rank = k_nearest(qi, np.hypot(rel[:, 0], rel[:, 1]), k)
+        a, t = qi[sel], ti[sel]
+        mate = np.zeros((n, k, 4))
+        mate[a, rank, 0:2] = rel[sel] / args.map_area
+        mate[a, rank, 2] = heading[t] / 180
+        mate[a, rank, 3] = 1
+        return enemy, mate
 
 
 # 环境测试程序
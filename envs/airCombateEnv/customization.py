@@ -130,32 +130,231 @@ def init_posture(init_scen, red, blue, random_r, random_b):
     return red, blue
 
 
+# 批量初始化使用的想定表：{init_scen: (红方随机, 红方固定, 蓝方随机, 蓝方固定)}
+# 随机：(x范围, y范围, 朝向)；固定：(坐标, 朝向)
+# 朝向：('u', 下限, 上限) 均匀分布；('two', 下限1, 上限1, 下限2, 上限2) 即 random_two_range；数值 为定值
+_POSTURE_BATCH = {
+    0: (((-500, 500), (-250, 250), ('u', 0, 360)), ((100.0, 0.0), 0),
+        ((-500, 500), (-250, 250), ('u', 0, 360)), ((-100.0, 0.0), 180)),
+    1: (((100, 500), (-50, 50), ('u', 150, 210)), ((100.0, 0.0), 0),
+        ((-100, -500), (-50, 50), ('two', 0, 30, 330, 360)), ((-100.0, 0.0), 180)),
+    2: (((100, 500), (-50, 50), ('two', 0, 30, 330, 360)), ((100.0, 0.0), 180),
+        ((-100, -500), (-50, 50), ('u', 150, 210)), ((-100.0, 0.0), 0)),
+    3: (((100, 500), (-50, 50), ('u', 150, 210)), ((100.0, 0.0), 180),
+        ((-100, -500), (-50, 50), ('two', 0, 30, 330, 360)), ((-100.0, 0.0), 0)),
+    4: (((-50, 50), (-250, 250), 0), ((0.0, 100.0), 0),
+        ((-50, 50), (-250, 250), 0), ((0.0, -100.0), 0)),
+}
+
+
+def _init_side_batch(n, flag_random, random_setting, fixed_setting, name):
+    if flag_random == 1:
+        x_range, y_range, heading = random_setting
+        pos = np.stack((np.random.uniform(x_range[0], x_range[1], n),
+                        np.random.uniform(y_range[0], y_range[1], n)), axis=1)
+        if isinstance(heading, tuple) and heading[0] == 'u':
+            heading = np.random.uniform(heading[1], heading[2], n)
+        elif isinstance(heading, tuple) and heading[0] == 'two':
+            one = np.random.uniform(heading[1], heading[2], n)
+            two = np.random.uniform(heading[3], heading[4], n)
+            heading = np.where(np.random.rand(n) < 0.5, one, two)
+        else:
+            heading = np.full(n, float(heading))
+    elif flag_random == 0:
+        pos = np.tile(np.array(fixed_setting[0]), (n, 1))
+        heading = np.full(n, float(fixed_setting[1]))
+    else:
+        raise Exception(name + " error")
+    return pos, heading
+
+
+def init_posture_batch(init_scen, n, random_r, random_b):
+    """
+    param:
+        init_scen:      场景类型
+        n:              需要初始化的环境数量
+        random_r:       红方是否随机；1：随机；0：固定
+        random_b:       蓝方是否随机；1：随机；0：固定
+    return:
+        红方坐标(n,2)、红方朝向(n,)、蓝方坐标(n,2)、蓝方朝向(n,)
+    主要逻辑：
+        与 init_posture 的想定完全相同，一次性为 n 个环境生成红蓝方初始姿态
+    """
+    if init_scen not in _POSTURE_BATCH:
+        raise Exception("init_scen error")
+    red_random, red_fixed, blue_random, blue_fixed = _POSTURE_BATCH[init_scen]
+    red_pos, red_heading = _init_side_batch(n, random_r, red_random, red_fixed, "random_r")
+    blue_pos, blue_heading = _init_side_batch(n, random_b, blue_random, blue_fixed, "random_b")
+    return red_pos, red_heading, blue_pos, blue_heading
+
+
+def init_formation(init_scen, n_red, n_blue, random_r, random_b, spacing):
+    """
+    param:
+        init_scen:      场景类型
+        n_red:          红方飞机数量
+        n_blue:         蓝方飞机数量
+        random_r:       红方是否随机；1：随机；0：固定
+        random_b:       蓝方是否随机；1：随机；0：固定
+        spacing:        编队内相邻飞机的间隔
+    return:
+        红方坐标(n_red,2)、红方朝向(n_red,)、蓝方坐标(n_blue,2)、蓝方朝向(n_blue,)
+    主要逻辑：
+        按 init_posture 的想定生成双方编队中心的位置和朝向，
+        各方飞机以中心为中点、垂直于朝向排成横队（朝向相同）
+    """
+    red_pos, red_heading, blue_pos, blue_heading = init_posture_batch(init_scen, 1, random_r, random_b)
+    return _formation_line(red_pos[0], red_heading[0], n_red, spacing) + \
+        _formation_line(blue_pos[0], blue_heading[0], n_blue, spacing)
+
+
+def _formation_line(center, heading, n, spacing):
+    offset = (np.arange(n) - (n - 1) / 2) * spacing
+    theta = np.radians(heading + 90)
+    pos = center + offset[:, None] * np.array([np.cos(theta), np.sin(theta)])
+    return pos, np.full(n, heading)
+
+
 # ===========================================
 #                state setting
 # ===========================================
 
-def get_state(aircraft_a, aircraft_b, adv_count):
+def get_state(aircraft_a, aircraft_b, adv_count, out=None):
     """
     计算aircraft_b的状态
     :param aircraft_a:
     :param aircraft_b:
     :param adv_count:优势次数
+    :param out:写入的数组(6,)，为 None 时新建
     :return:aircraft_b的状态
     """
-    state = np.concatenate(((aircraft_b.ac_pos - aircraft_a.ac_pos) / args.map_area,
-                            [aircraft_b.ac_heading / 180, aircraft_a.ac_heading / 180,
-                             aircraft_b.ac_bank_angle / 80, adv_count / 10]))
-    return state
+    if out is None:
+        out = np.empty(6)
+    pos_a, pos_b = aircraft_a.ac_pos, aircraft_b.ac_pos
+    map_area = args.map_area
+    out[0] = (pos_b[0] - pos_a[0]) / map_area
+    out[1] = (pos_b[1] - pos_a[1]) / map_area
+    out[2] = aircraft_b.ac_heading / 180
+    out[3] = aircraft_a.ac_heading / 180
+    out[4] = aircraft_b.ac_bank_angle / 80
+    out[5] = adv_count / 10
+    return out
+
+
+def get_state_direct_pos(aircraft_a, aircraft_b, adv_count, out=None):
+    if out is None:
+        out = np.empty(10)
+    pos_a, pos_b = aircraft_a.ac_pos, aircraft_b.ac_pos
+    map_area = args.map_area
+    out[0] = (pos_b[0] - pos_a[0]) / map_area
+    out[1] = (pos_b[1] - pos_a[1]) / map_area
+    out[2] = pos_b[0] / map_area
+    out[3] = pos_b[1] / map_area
+    out[4] = pos_a[0] / map_area
+    out[5] = pos_a[1] / map_area
+    out[6] = aircraft_b.ac_heading / 180
+    out[7] = aircraft_a.ac_heading / 180
+    out[8] = aircraft_b.ac_bank_angle / 80
+    out[9] = adv_count / 10
+    return out
+
+
+def get_state_batch(pos_r, heading_r, bank_r, pos_b, heading_b, bank_b, adv_count, out=None):
+    """
+    get_state 的批量版本，一次计算 n 局中蓝方和红方的状态
+    :param pos_r, heading_r, bank_r: 红方的坐标(n,2)、朝向角(n,)、滚转角(n,)
+    :param pos_b, heading_b, bank_b: 蓝方的坐标(n,2)、朝向角(n,)、滚转角(n,)
+    :param adv_count:优势次数(n,)
+    :param out:写入的数组(2,n,6)，为 None 时新建
+    :return:out，out[0] 为蓝方状态 get_state(red, blue)，out[1] 为红方状态 get_state(blue, red)
+    """
+    if out is None:
+        out = np.empty((2, len(pos_r), 6))
+    s_b, s_r = out[0], out[1]
+    np.subtract(pos_b, pos_r, out=s_b[:, 0:2])
+    s_b[:, 0:2] /= args.map_area
+    np.negative(s_b[:, 0:2], out=s_r[:, 0:2])
+    np.divide(heading_b, 180, out=s_b[:, 2])
+    np.divide(heading_r, 180, out=s_b[:, 3])
+    s_r[:, 2] = s_b[:, 3]
+    s_r[:, 3] = s_b[:, 2]
+    np.divide(bank_b, 80, out=s_b[:, 4])
+    np.divide(bank_r, 80, out=s_r[:, 4])
+    np.divide(adv_count, 10, out=s_b[:, 5])
+    s_r[:, 5] = s_b[:, 5]
+    return out
+
 
+def get_state_direct_pos_batch(pos_r, heading_r, bank_r, pos_b, heading_b, bank_b, adv_count, out=None):
+    if out is None:
+        out = np.empty((2, len(pos_r), 10))
+    s_b, s_r = out[0], out[1]
+    np.subtract(pos_b, pos_r, out=s_b[:, 0:2])
+    s_b[:, 0:2] /= args.map_area
+    np.negative(s_b[:, 0:2], out=s_r[:, 0:2])
+    np.divide(pos_b, args.map_area, out=s_b[:, 2:4])
+    np.divide(pos_r, args.map_area, out=s_b[:, 4:6])
+    s_r[:, 2:4] = s_b[:, 4:6]
+    s_r[:, 4:6] = s_b[:, 2:4]
+    np.divide(heading_b, 180, out=s_b[:, 6])
+    np.divide(heading_r, 180, out=s_b[:, 7])
+    s_r[:, 6] = s_b[:, 7]
+    s_r[:, 7] = s_b[:, 6]
+    np.divide(bank_b, 80, out=s_b[:, 8])
+    np.divide(bank_r, 80, out=s_r[:, 8])
+    np.divide(adv_count, 10, out=s_b[:, 9])
+    s_r[:, 9] = s_b[:, 9]
+    return out
 
-def get_state_direct_pos(aircraft_a, aircraft_b, adv_count):
-    state = np.concatenate(((aircraft_b.ac_pos - aircraft_a.ac_pos) / args.map_area,
-                            aircraft_b.ac_pos / args.map_area, aircraft_a.ac_pos / args.map_area,
-                            [aircraft_b.ac_heading / 180, aircraft_a.ac_heading / 180,
-                             aircraft_b.ac_bank_angle / 80, adv_count / 10]))
-    return state
+
+# 原始位姿：[红方x, 红方y, 红方朝向, 红方滚转, 蓝方x, 蓝方y, 蓝方朝向, 蓝方滚转, 优势次数, 视角(0蓝方 1红方)]
+POSE_DIM = 10
+
+
+def get_pose(red, blue, adv_count, out=None):
+    """
+    记录双方位姿，REGISTRY_STATE 中的状态均可由位姿计算（见 get_state_from_pose）
+    :param red, blue: 红、蓝方飞机
+    :param adv_count: 优势次数
+    :param out: 写入的数组(2,POSE_DIM)，为 None 时新建
+    :return: out，out[0] 为蓝方视角的位姿，out[1] 为红方视角的位姿
+    """
+    if out is None:
+        out = np.empty((2, POSE_DIM))
+    out[:, 0:2] = red.ac_pos
+    out[:, 2] = red.ac_heading
+    out[:, 3] = red.ac_bank_angle
+    out[:, 4:6] = blue.ac_pos
+    out[:, 6] = blue.ac_heading
+    out[:, 7] = blue.ac_bank_angle
+    out[:, 8] = adv_count
+    out[0, 9] = 0
+    out[1, 9] = 1
+    return out
+
+
+def get_state_from_pose(pose, state_setting):
+    """
+    由位姿批量计算状态
+    :param pose: 位姿(n,POSE_DIM)
+    :param state_setting: REGISTRY_STATE_BATCH 中的状态名
+    :return: 状态(n,dim)，第 i 行为 pose[i] 视角一方的状态
+    """
+    out = REGISTRY_STATE_BATCH[state_setting](pose[:, 0:2], pose[:, 2], pose[:, 3], pose[:, 4:6], pose[:, 6],
+                                              pose[:, 7], pose[:, 8])
+    return out[pose[:, 9].astype(np.int64), np.arange(len(pose))]
 
 
 REGISTRY_STATE = {}
 REGISTRY_STATE['orign_state'] = get_state
 REGISTRY_STATE['state_direct_pos'] = get_state_direct_pos
+
+# 状态各维绝对值的上界（相对坐标可能略超出地图，留有余量），用于经验池的 int16 量化，名字与 REGISTRY_STATE 一一对应
+REGISTRY_STATE_BOUND = {}
+REGISTRY_STATE_BOUND['orign_state'] = [2.5, 2.5, 2, 2, 1, 1]
+REGISTRY_STATE_BOUND['state_direct_pos'] = [2.5, 2.5, 1.25, 1.25, 1.25, 1.25, 2, 2, 1, 1]
+
+# 批量（向量化环境）使用的状态函数，名字与 REGISTRY_STATE 一一对应
+REGISTRY_STATE_BATCH = {}
+REGISTRY_STATE_BATCH['orign_state'] = get_state_batch
+REGISTRY_STATE_BATCH['state_direct_pos'] = get_state_direct_pos_batch
@@ -0,0 +1,193 @@
+#!usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+1v1 空战的几何关系与奖励计算（向量化）：
+    输入红蓝双方的坐标、朝向角等（标量或任意形状的数组，坐标最后一维为 x,y），
+    一次计算双方的 ATA/AA、距离、reward shaping 的势函数、adv_count、reward 和 done。
+    AirCombatEnv（标量）和 VecAirCombatEnv（批量）均调用此模块。
+    标量输入（单局）走 math 实现的同一套公式，避免 numpy 对单个数的调用开销。
+'''
+import collections
+import math
+import numpy as np
+
+# 默认的优势判断指标，与 AirCombatEnv 中的定义一致
+AA_RANGE = 60  # 视界角范围
+ATA_RANGE = 30  # 天线拂擦角范围
+DIS_MAX = 500  # 距离最大值
+DIS_MIN = 100  # 距离最小值
+
+Engagement = collections.namedtuple("Engagement", ["ATA_b", "AA_b", "ATA_r", "AA_r", "dis", "adv_count",
+                                                   "fai_b", "fai_r", "reward_b", "reward_r", "done", "success"])
+
+
+def get_angles(red_pos, red_heading, blue_pos, blue_heading):
+    """
+    param:
+        red_pos:            红方坐标 (..., 2)
+        red_heading:        红方朝向角 (...)
+        blue_pos:           蓝方坐标 (..., 2)
+        blue_heading:       蓝方朝向角 (...)
+    return:
+        蓝方ATA、AA，红方ATA、AA，距离
+    主要逻辑：
+        与 AirCombatEnv._getAngle 相同（见doc/pic/envs_airCombateEnv_001.png），
+        只计算一次 atan2，另一方向的视线角由其加 180 度得到；4 个角度一起限幅
+    """
+    dx = red_pos[..., 0] - blue_pos[..., 0]
+    dy = red_pos[..., 1] - blue_pos[..., 1]
+    dis = np.sqrt(dx * dx + dy * dy)
+    theta_br = np.degrees(np.arctan2(dy, dx)) % 360
+    theta_rb = (theta_br + 180) % 360
+    angles = np.array([blue_heading - theta_br, 180 + red_heading - theta_rb,
+                       red_heading - theta_rb, 180 + blue_heading - theta_br])
+    angles = np.where(angles > 180, 360 - angles, np.where(angles < -180, 360 + angles, angles))
+    return angles[0], angles[1], angles[2], angles[3], dis
+
+
+def get_potential(dis, ATA_b, AA_b, ATA_r, AA_r, dis_max=DIS_MAX, dis_min=DIS_MIN):
+    """
+    return:
+        蓝方、红方 reward shaping 的势函数 fai
+    """
+    RD = np.exp(-(np.abs(dis - ((dis_max + dis_min) / 2)) / 180 * 0.1))
+    RA_b = 1 - ((1 - np.abs(ATA_b) / 180) + (1 - np.abs(AA_b) / 180))
+    RA_r = 1 - ((1 - np.abs(ATA_r) / 180) + (1 - np.abs(AA_r) / 180))
+    return -0.01 * RA_b * RD, -0.01 * RA_r * RD
+
+
+def update_adv_count(adv_count, dis, AA_r, ATA_r, AA_b, ATA_b, aa_range=AA_RANGE, ata_range=ATA_RANGE,
+                     dis_max=DIS_MAX, dis_min=DIS_MIN):
+    """
+    计算红蓝方优势次数，与 AirCombatEnv._calculate_Advantages 相同
+    :param adv_count:优势次数：负数为红方优势态势，正数为蓝方优势态势
+    :return:更新后的优势次数
+    """
+    in_range = (dis < dis_max) & (dis > dis_min)
+    adv_b = in_range & (np.abs(AA_b) < aa_range) & (np.abs(ATA_b) < ata_range)
+    adv_r = in_range & (np.abs(AA_r) < aa_range) & (np.abs(ATA_r) < ata_range)
+    return np.where(adv_b, np.where(adv_count >= 0, adv_count + 1, 1),
+                    np.where(adv_r, np.where(adv_count <= 0, adv_count - 1, -1), 0))
+
+
+def _wrap(angle):
+    if angle > 180:
+        return 360 - angle
+    if angle < -180:
+        return 360 + angle
+    return angle
+
+
+def _step_scalar(red_pos, red_heading, blue_pos, blue_heading, adv_count, aa_range, ata_range, dis_max, dis_min):
+    """
+    单局的 get_angles + update_adv_count + get_potential，公式与数组版本相同
+    """
+    dx = red_pos[0] - blue_pos[0]
+    dy = red_pos[1] - blue_pos[1]
+    dis = math.sqrt(dx * dx + dy * dy)
+    theta_br = math.degrees(math.atan2(dy, dx)) % 360
+    theta_rb = (theta_br + 180) % 360
+    ATA_b = _wrap(blue_heading - theta_br)
+    AA_b = _wrap(180 + red_heading - theta_rb)
+    ATA_r = _wrap(red_heading - theta_rb)
+    AA_r = _wrap(180 + blue_heading - theta_br)
+    if dis_min < dis < dis_max and abs(AA_b) < aa_range and abs(ATA_b) < ata_range:
+        adv_count = adv_count + 1 if adv_count >= 0 else 1
+    elif dis_min < dis < dis_max and abs(AA_r) < aa_range and abs(ATA_r) < ata_range:
+        adv_count = adv_count - 1 if adv_count <= 0 else -1
+    else:
+        adv_count = 0
+    RD = math.exp(-(abs(dis - ((dis_max + dis_min) / 2)) / 180 * 0.1))
+    fai_b = -0.01 * (1 - ((1 - abs(ATA_b) / 180) + (1 - abs(AA_b) / 180))) * RD
+    fai_r = -0.01 * (1 - ((1 - abs(ATA_r) / 180) + (1 - abs(AA_r) / 180))) * RD
+    return ATA_b, AA_b, ATA_r, AA_r, dis, adv_count, fai_b, fai_r
+
+
+def engagement_reset(red_pos, red_heading, blue_pos, blue_heading, **kwargs):
+    """
+    return:
+        Engagement，其中 reward、done、success 为 0
+    主要逻辑：
+        重置时的计算：优势次数从0开始更新一次，并计算初始势函数
+    """
+    if not isinstance(red_heading, np.ndarray):
+        eng = _step_scalar(red_pos, red_heading, blue_pos, blue_heading, 0, *_params(kwargs))
+        return Engagement(*eng, 0.0, 0.0, False, 0)
+    ATA_b, AA_b, ATA_r, AA_r, dis = get_angles(red_pos, red_heading, blue_pos, blue_heading)
+    adv_count = update_adv_count(np.zeros(np.shape(dis), dtype=np.int64), dis, AA_r, ATA_r, AA_b, ATA_b,
+                                 **kwargs)
+    fai_b, fai_r = get_potential(dis, ATA_b, AA_b, ATA_r, AA_r, kwargs.get("dis_max", DIS_MAX),
+                                 kwargs.get("dis_min", DIS_MIN))
+    zero = np.zeros(np.shape(dis))
+    return Engagement(ATA_b, AA_b, ATA_r, AA_r, dis, adv_count, fai_b, fai_r, zero, zero,
+                      zero.astype(bool), zero.astype(np.int64))
+
+
+def engagement_step(red_pos, red_heading, blue_pos, blue_heading, adv_count, fai_b, fai_r, red_oil, blue_oil,
+                    map_area, **kwargs):
+    """
+    param:
+        red_pos, red_heading, blue_pos, blue_heading:   红蓝方坐标、朝向角
+        adv_count:                                      上一步的优势次数
+        fai_b, fai_r:                                   上一步的势函数
+        red_oil, blue_oil:                              红蓝方剩余油量
+        map_area:                                       地图范围
+        kwargs:                                         aa_range, ata_range, dis_max, dis_min
+    return:
+        Engagement
+    主要逻辑：
+        与 AirCombatEnv._get_reward 相同，按 蓝胜、红胜、油量耗尽、蓝方出界、红方出界 的顺序判断 reward 和 done
+    """
+    if not isinstance(red_heading, np.ndarray):
+        return _engagement_step_scalar(red_pos, red_heading, blue_pos, blue_heading, adv_count, fai_b, fai_r,
+                                       red_oil, blue_oil, map_area, _params(kwargs))
+    ATA_b, AA_b, ATA_r, AA_r, dis = get_angles(red_pos, red_heading, blue_pos, blue_heading)
+    adv_count = update_adv_count(adv_count, dis, AA_r, ATA_r, AA_b, ATA_b, **kwargs)
+    new_fai_b, new_fai_r = get_potential(dis, ATA_b, AA_b, ATA_r, AA_r, kwargs.get("dis_max", DIS_MAX),
+                                         kwargs.get("dis_min", DIS_MIN))
+    shaping_b = (new_fai_b - fai_b) - 0.001
+    shaping_r = (new_fai_r - fai_r) - 0.001
+
+    blue_win = adv_count >= 9
+    red_win = adv_count <= -9
+    no_oil = (red_oil <= 0) & (blue_oil <= 0)
+    blue_out = np.abs(blue_pos).max(axis=-1) > map_area
+    red_out = np.abs(red_pos).max(axis=-1) > map_area
+    draw = no_oil | blue_out
+    reward_b = np.where(blue_win, 2.0, np.where(red_win, -2.0, np.where(draw, -1.0, shaping_b)))
+    reward_r = np.where(blue_win, -2.0, np.where(red_win, 2.0,
+                        np.where(no_oil | (red_out & ~blue_out), -1.0, shaping_r)))
+    done = blue_win | red_win | draw | red_out
+    success = np.where(blue_win, 1, np.where(red_win, -1, 0))
+    return Engagement(ATA_b, AA_b, ATA_r, AA_r, dis, adv_count, new_fai_b, new_fai_r, reward_b, reward_r, done,
+                      success)
+
+
+def _params(kwargs):
+    return (kwargs.get("aa_range", AA_RANGE), kwargs.get("ata_range", ATA_RANGE),
+            kwargs.get("dis_max", DIS_MAX), kwargs.get("dis_min", DIS_MIN))
+
+
+def _engagement_step_scalar(red_pos, red_heading, blue_pos, blue_heading, adv_count, fai_b, fai_r, red_oil,
+                            blue_oil, map_area, params):
+    ATA_b, AA_b, ATA_r, AA_r, dis, adv_count, new_fai_b, new_fai_r = \
+        _step_scalar(red_pos, red_heading, blue_pos, blue_heading, adv_count, *params)
+    done = True
+    success = 0
+    if adv_count >= 9:
+        reward_b, reward_r, success = 2.0, -2.0, 1
+    elif adv_count <= -9:
+        reward_b, reward_r, success = -2.0, 2.0, -1
+    elif red_oil <= 0 and blue_oil <= 0:
+        reward_b = reward_r = -1.0
+    elif max(abs(blue_pos[0]), abs(blue_pos[1])) > map_area:
+        reward_b, reward_r = -1.0, (new_fai_r - fai_r) - 0.001
+    elif max(abs(red_pos[0]), abs(red_pos[1])) > map_area:
+        reward_b, reward_r = (new_fai_b - fai_b) - 0.001, -1.0
+    else:
+        reward_b = (new_fai_b - fai_b) - 0.001
+        reward_r = (new_fai_r - fai_r) - 0.001
+        done = False
+    return Engagement(ATA_b, AA_b, ATA_r, AA_r, dis, adv_count, new_fai_b, new_fai_r, reward_b, reward_r, done,
+                      success)
@@ -0,0 +1,94 @@
+#!usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+大规模 N v M 空战中使用的均匀网格空间索引：
+    地图 [-map_area, map_area]^2 划分为边长 cell_size（取 Dis_max）的网格，
+    只有位于相邻 3x3 网格内的飞机才可能距离小于 Dis_max，即只有这些飞机对需要计算优势和奖励。
+    网格按 网格编号 对飞机做计数排序（order / start），查询时一次向量化展开全部候选飞机对。
+'''
+import math
+import numpy as np
+
+# 3x3 相邻网格的偏移
+_NEIGHBOR_OFFSETS = np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)])
+
+
+class SpatialHashGrid(object):
+    def __init__(self, map_area, cell_size):
+        '''
+        param:
+            map_area:       地图范围，坐标取值 [-map_area, map_area]
+            cell_size:      网格边长，不小于需要查询的最大距离
+        '''
+        self.map_area = map_area
+        self.cell_size = cell_size
+        self.n_side = max(1, int(math.ceil(2 * map_area / cell_size)))
+        self.n_cells = self.n_side * self.n_side
+        self.cell = None  # 每架飞机所在的网格编号，被屏蔽的飞机为 n_cells
+        self.order = None  # 按网格编号排序后的飞机序号
+        self.start = None  # 第 c 个网格内的飞机为 order[start[c]:start[c + 1]]
+
+    def cell_xy(self, pos):
+        '''
+        坐标 (n,2) 对应的网格坐标 (n,2)，地图外的坐标归入边缘网格
+        '''
+        xy = np.floor((pos + self.map_area) / self.cell_size).astype(np.int64)
+        return np.clip(xy, 0, self.n_side - 1)
+
+    def update(self, pos, mask=None):
+        '''
+        param:
+            pos:    飞机坐标 (n,2)
+            mask:   (n,) bool，False 的飞机不加入网格（如已损失的飞机）
+        主要逻辑：
+            重新计算每架飞机的网格编号，没有飞机跨越网格（且 mask 未变）时保留上一次的索引，
+            否则按网格编号重新排序
+        '''
+        xy = self.cell_xy(pos)
+        cell = xy[:, 0] * self.n_side + xy[:, 1]
+        if mask is not None:
+            cell[~mask] = self.n_cells
+        if self.cell is not None and len(cell) == len(self.cell) and np.array_equal(cell, self.cell):
+            return
+        self.cell = cell
+        self.order = np.argsort(cell, kind='stable')
+        self.start = np.searchsorted(cell[self.order], np.arange(self.n_cells + 1))
+
+    def query(self, pos, mask=None):
+        '''
+        param:
+            pos:    查询点坐标 (nq,2)
+            mask:   (nq,) bool，False 的查询点不返回候选
+        return:
+            候选对 (qi, ti)：查询点 qi 与网格中的飞机 ti 位于相邻 3x3 网格内
+        '''
+        nb = self.cell_xy(pos)[:, None, :] + _NEIGHBOR_OFFSETS[None, :, :]  # (nq,9,2)
+        valid = ((nb >= 0) & (nb < self.n_side)).all(axis=2)
+        if mask is not None:
+            valid &= mask[:, None]
+        cid = np.where(valid, nb[:, :, 0] * self.n_side + nb[:, :, 1], 0)
+        lo = self.start[cid]
+        cnt = np.where(valid, self.start[cid + 1] - lo, 0).ravel()
+        total = cnt.sum()
+        qi = np.repeat(np.repeat(np.arange(len(pos)), len(_NEIGHBOR_OFFSETS)), cnt)
+        # 每个网格段在结果中的起点，展开为 order 中的下标
+        seg_start = np.cumsum(cnt) - cnt
+        idx = np.arange(total) + np.repeat(lo.ravel() - seg_start, cnt)
+        return qi, self.order[idx]
+
+
+def k_nearest(agent, dis, k):
+    '''
+    param:
+        agent:  每个候选对所属的飞机序号 (P,)
+        dis:    候选对的距离 (P,)
+        k:      每架飞机保留的候选数量
+    return:
+        sel, rank：候选对中被保留的下标及其在该飞机的 k 个位置中的序号（按距离从近到远）
+    '''
+    order = np.lexsort((dis, agent))
+    agent_sorted = agent[order]
+    rank = np.arange(len(order)) - np.searchsorted(agent_sorted, agent_sorted)
+    keep = rank < k
+    return order[keep], rank[keep]
@@ -50,39 +50,342 @@ class Aircraft(object):
     # 子飞机类型设计
 
 
-class AircraftDefault(Aircraft):
+class AircraftFleet(object):
+    '''
+    结构化数组(structure of arrays)形式的 AircraftDefault 飞机集合：
+        n 架飞机的运动学状态保存在一块预分配的 (7, n) 连续内存 block 中，
+        pos / heading / bank_angle / oil / speed / bank_angle_max 均为 block 的视图，
+        move 一次向量化调用推演全部飞机。
+    单架飞机可通过 aircraft(row) 得到 AircraftDefault 视图，两者共享同一块内存。
 
-    def __init__(self, id=None, ac_speed=200, ac_bank_angle_max=80):
-        self.ac_pos = np.array([0.0, 0.0])  # 二维坐标
-        self.ac_heading = 0  # 朝向角,向南
-        self.ac_bank_angle = 0  # 滚转角一开始应该都为0
-        self.oil = args.Sum_Oil
-        self.ac_bank_angle_max = ac_bank_angle_max  # φ_max
-        self.ac_speed = ac_speed  # 飞机速度，m/s
+    积分方式 args.integration_mode：
+        euler:  每个子步长先更新滚转角，再用显式欧拉法更新朝向角和坐标（原有模型，用于复现旧结果）
+        exact:  子步长内滚转角为常数，飞机做匀速圆周运动，朝向角和坐标按圆弧解析解计算；
+                对每个可达滚转角和动作预先计算整个决策步长的 朝向变化 和 (朝向为0时的)位移，
+                每步只需计算一次初始朝向的 cos / sin
+    '''
+    __slots__ = ('n', 'block', 'pos', 'x', 'y', 'heading', 'bank_angle', 'oil', 'speed', 'bank_angle_max',
+                 'td', 'n_sub', 'roll_rate', 'G', 'integration_mode', 'bank_step', 'exact_banks', 'exact_table')
+
+    def __init__(self, n, ac_speed=200, ac_bank_angle_max=80, dtype=np.float64):
+        '''
+        param:
+            n:                  飞机数量
+            ac_speed:           飞机速度，m/s，可为标量或长度为 n 的数组
+            ac_bank_angle_max:  最大滚转角 φ_max，可为标量或长度为 n 的数组
+            dtype:              np.float32 或 np.float64
+        '''
+        self.n = n
+        self.block = np.zeros((7, n), dtype=dtype)
+        self.x = self.block[0]
+        self.y = self.block[1]
+        self.pos = self.block[0:2].T  # (n,2) 二维坐标
+        self.heading = self.block[2]  # 朝向角
+        self.bank_angle = self.block[3]  # 滚转角
+        self.oil = self.block[4]
+        self.speed = self.block[5]
+        self.bank_angle_max = self.block[6]
+        self.oil[:] = args.Sum_Oil
+        self.speed[:] = ac_speed
+        self.bank_angle_max[:] = ac_bank_angle_max
+        # 缓存参数，避免每次 move 时查找 args
         self.td = args.map_t / args.map_t_n
+        self.n_sub = args.map_t_n
+        self.roll_rate = args.roll_rate
+        self.G = args.G
+        self.integration_mode = args.integration_mode
+        if self.integration_mode not in ('euler', 'exact'):
+            raise Exception("integration_mode error")
+        # exact 模式的预计算表，仅在所有飞机速度、最大滚转角相同时使用
+        self.bank_step = self.roll_rate * self.td  # 每个子步长滚转角的变化量
+        self.exact_banks = self.exact_table = None
+        if self.integration_mode == 'exact' and np.ndim(ac_speed) == 0 and np.ndim(ac_bank_angle_max) == 0:
+            self.exact_banks, self.exact_table = self._build_exact_table(float(ac_speed), float(ac_bank_angle_max))
+
+    def __len__(self):
+        return self.n
+
+    def aircraft(self, row):
+        '''
+        返回第 row 架飞机的 AircraftDefault 视图
+        '''
+        return AircraftDefault(row, fleet=self, row=row)
 
     def move(self, action):
-        for i in range(args.map_t_n):
-            # 飞机运动计算
-            self.ac_bank_angle = self.ac_bank_angle + (action - 1) * args.roll_rate * self.td
-            self.ac_bank_angle = max(self.ac_bank_angle, -self.ac_bank_angle_max)
-            self.ac_bank_angle = min(self.ac_bank_angle, self.ac_bank_angle_max)
-            self.turn_rate = (args.G / self.ac_speed) * math.tan(self.ac_bank_angle * math.pi / 180) * 180 / math.pi
-            self.ac_heading = self.ac_heading - self.turn_rate * self.td
-            if self.ac_heading > 360:
-                self.ac_heading -= 360
-            elif self.ac_heading < 0:
-                self.ac_heading += 360
-            self.ac_pos[0] = self.ac_pos[0] + self.ac_speed * self.td * math.cos(self.ac_heading * math.pi / 180)
-            self.ac_pos[1] = self.ac_pos[1] + self.ac_speed * self.td * math.sin(self.ac_heading * math.pi / 180)
+        '''
+        param:
+            action:     全部飞机的动作(n,)，取值 [0,1,2]
+        主要逻辑：
+            与 AircraftDefault.move 相同的动力学模型，对 block 原地更新
+        '''
+        action = np.asarray(action)
+        if self.integration_mode == 'euler':
+            self._move_euler(action)
+        elif not self._move_exact_table(action):
+            self._move_exact_arc(action)
         self.oil -= 1
 
+    def _move_euler(self, action):
+        td = self.td
+        d_bank = (action - 1) * (self.roll_rate * td)
+        turn_k = (self.G * td * 180 / math.pi) / self.speed
+        step = self.speed * td
+        x, y, heading, bank_angle = self.x, self.y, self.heading, self.bank_angle
+        for i in range(self.n_sub):
+            bank_angle += d_bank
+            np.clip(bank_angle, -self.bank_angle_max, self.bank_angle_max, out=bank_angle)
+            heading -= turn_k * np.tan(bank_angle * (math.pi / 180))
+            heading -= np.where(heading > 360, 360, np.where(heading < 0, -360, 0))
+            heading_rad = heading * (math.pi / 180)
+            x += step * np.cos(heading_rad)
+            y += step * np.sin(heading_rad)
+
+    def _move_exact_table(self, action):
+        '''
+        查表推演一个决策步长，滚转角不在预计算网格上时返回 False
+        '''
+        if self.exact_table is None:
+            return False
+        bank_idx = np.rint(self.bank_angle / self.bank_step).astype(np.int64) + (len(self.exact_banks) // 2)
+        if bank_idx.min() < 0 or bank_idx.max() >= len(self.exact_banks) or \
+                np.abs(self.exact_banks[bank_idx] - self.bank_angle).max() > 1e-6:
+            return False
+        d_heading, dx, dy, bank_end = self.exact_table[action, bank_idx].T
+        heading_rad = self.heading * (math.pi / 180)
+        cos_h, sin_h = np.cos(heading_rad), np.sin(heading_rad)
+        self.x += dx * cos_h - dy * sin_h
+        self.y += dx * sin_h + dy * cos_h
+        self.heading[:] = np.mod(self.heading + d_heading, 360)
+        self.bank_angle[:] = bank_end
+        return True
+
+    def _move_exact_arc(self, action):
+        '''
+        逐个子步长按圆弧解析解推演（不查表），用于速度不一致或滚转角不在网格上的情况
+        '''
+        td = self.td
+        d_bank = (action - 1) * (self.roll_rate * td)
+        speed = self.speed
+        x, y, bank_angle = self.x, self.y, self.bank_angle
+        heading_rad = self.heading * (math.pi / 180)
+        for i in range(self.n_sub):
+            bank_angle += d_bank
+            np.clip(bank_angle, -self.bank_angle_max, self.bank_angle_max, out=bank_angle)
+            omega = (self.G / speed) * np.tan(bank_angle * (math.pi / 180))  # 转弯角速度，rad/s
+            # 弦长 = 2V/ω·sin(ωt/2)，方向为子步长中点的朝向
+            chord = speed * td * np.sinc(omega * td / (2 * math.pi))
+            heading_mid = heading_rad - omega * (td / 2)
+            x += chord * np.cos(heading_mid)
+            y += chord * np.sin(heading_mid)
+            heading_rad -= omega * td
+        self.heading[:] = np.mod(heading_rad * (180 / math.pi), 360)
+
+    def _build_exact_table(self, ac_speed, ac_bank_angle_max):
+        '''
+        param:
+            ac_speed:           飞机速度
+            ac_bank_angle_max:  最大滚转角
+        return:
+            可达滚转角网格 banks(2K+1,)，
+            预计算表 table(3, 2K+1, 4)：[动作, 初始滚转角] -> [朝向变化(度), 朝向为0时的位移x, y, 结束时滚转角]
+        主要逻辑：
+            滚转角从0开始，每个子步长变化 ±bank_step 并限幅，可达值为有限网格；
+            对每个网格点和动作，按圆弧解析解推演 map_t_n 个子步长（弧度制）
+        '''
+        td = self.td
+        K = int(math.ceil(ac_bank_angle_max / self.bank_step - 1e-9))
+        banks = np.clip(np.arange(-K, K + 1) * self.bank_step, -ac_bank_angle_max, ac_bank_angle_max)
+        table = np.zeros((3, len(banks), 4))
+        for action in range(3):
+            for i, bank in enumerate(banks):
+                heading = x = y = 0.0
+                for k in range(self.n_sub):
+                    bank = min(max(bank + (action - 1) * self.bank_step, -ac_bank_angle_max), ac_bank_angle_max)
+                    omega = (self.G / ac_speed) * math.tan(math.radians(bank))
+                    chord = ac_speed * td if omega == 0 else 2 * ac_speed / omega * math.sin(omega * td / 2)
+                    x += chord * math.cos(heading - omega * td / 2)
+                    y += chord * math.sin(heading - omega * td / 2)
+                    heading -= omega * td
+                table[action, i] = (math.degrees(heading), x, y, bank)
+        return banks, table
+
+
+class AircraftDefault(Aircraft):
+    '''
+    单架飞机：AircraftFleet 中某一行的视图，
+    ac_pos、ac_heading 等属性直接读写 fleet 的 block
+    '''
+    def __init__(self, id=None, ac_speed=200, ac_bank_angle_max=80, fleet=None, row=0):
+        # 未指定 fleet 时新建只有一架飞机的 fleet：
+        # 朝向角为0（向南），滚转角一开始为0，油量为 args.Sum_Oil
+        if fleet is None:
+            fleet = AircraftFleet(1, ac_speed, ac_bank_angle_max)
+            row = 0
+        self.id = id
+        self.fleet = fleet
+        self.row = row
+        self._pos = fleet.pos[row]  # 二维坐标
+
+    # ---- fleet 视图属性 ----
+    @property
+    def ac_pos(self):
+        return self._pos
+
+    @ac_pos.setter
+    def ac_pos(self, value):
+        self._pos[:] = value
+
+    @property
+    def ac_heading(self):
+        return self.fleet.heading[self.row]
+
+    @ac_heading.setter
+    def ac_heading(self, value):
+        self.fleet.heading[self.row] = value
+
+    @property
+    def ac_bank_angle(self):
+        return self.fleet.bank_angle[self.row]
+
+    @ac_bank_angle.setter
+    def ac_bank_angle(self, value):
+        self.fleet.bank_angle[self.row] = value
+
+    @property
+    def oil(self):
+        return self.fleet.oil[self.row]
+
+    @oil.setter
+    def oil(self, value):
+        self.fleet.oil[self.row] = value
+
+    @property
+    def ac_speed(self):
+        return self.fleet.speed[self.row]  # 飞机速度，m/s
+
+    @property
+    def ac_bank_angle_max(self):
+        return self.fleet.bank_angle_max[self.row]  # φ_max
+
+    @property
+    def td(self):
+        return self.fleet.td
+
+    def move(self, action):
+        if self.fleet.integration_mode == 'exact':
+            self._move_exact(action)
+            return
+        fleet, row = self.fleet, self.row
+        td = fleet.td
+        ac_speed = float(fleet.speed[row])
+        ac_bank_angle_max = float(fleet.bank_angle_max[row])
+        ac_bank_angle = float(fleet.bank_angle[row])
+        ac_heading = float(fleet.heading[row])
+        x = float(fleet.x[row])
+        y = float(fleet.y[row])
+        d_bank = (action - 1) * fleet.roll_rate * td
+        for i in range(fleet.n_sub):
+            # 飞机运动计算
+            ac_bank_angle = ac_bank_angle + d_bank
+            ac_bank_angle = max(ac_bank_angle, -ac_bank_angle_max)
+            ac_bank_angle = min(ac_bank_angle, ac_bank_angle_max)
+            turn_rate = (fleet.G / ac_speed) * math.tan(ac_bank_angle * math.pi / 180) * 180 / math.pi
+            ac_heading = ac_heading - turn_rate * td
+            if ac_heading > 360:
+                ac_heading -= 360
+            elif ac_heading < 0:
+                ac_heading += 360
+            x = x + ac_speed * td * math.cos(ac_heading * math.pi / 180)
+            y = y + ac_speed * td * math.sin(ac_heading * math.pi / 180)
+        fleet.bank_angle[row] = ac_bank_angle
+        fleet.heading[row] = ac_heading
+        fleet.x[row] = x
+        fleet.y[row] = y
+        fleet.oil[row] -= 1
+
+    def _move_exact(self, action):
+        '''
+        exact 模式：查 fleet 的预计算表，一个决策步长只需一次 cos / sin；
+        滚转角不在网格上时逐个子步长按圆弧解析解计算
+        '''
+        fleet, row = self.fleet, self.row
+        bank_angle = float(fleet.bank_angle[row])
+        heading = math.radians(float(fleet.heading[row]))
+        x = float(fleet.x[row])
+        y = float(fleet.y[row])
+        entry = None
+        if fleet.exact_table is not None:
+            i = int(round(bank_angle / fleet.bank_step)) + len(fleet.exact_banks) // 2
+            if 0 <= i < len(fleet.exact_banks) and abs(fleet.exact_banks[i] - bank_angle) <= 1e-6:
+                entry = fleet.exact_table[action, i]
+        if entry is not None:
+            d_heading, dx, dy, bank_angle = entry
+            cos_h, sin_h = math.cos(heading), math.sin(heading)
+            x += dx * cos_h - dy * sin_h
+            y += dx * sin_h + dy * cos_h
+            heading = math.degrees(heading) + d_heading
+        else:
+            td = fleet.td
+            ac_speed = float(fleet.speed[row])
+            ac_bank_angle_max = float(fleet.bank_angle_max[row])
+            for i in range(fleet.n_sub):
+                bank_angle = min(max(bank_angle + (action - 1) * fleet.bank_step, -ac_bank_angle_max),
+                                 ac_bank_angle_max)
+                omega = (fleet.G / ac_speed) * math.tan(math.radians(bank_angle))
+                chord = ac_speed * td if omega == 0 else 2 * ac_speed / omega * math.sin(omega * td / 2)
+                x += chord * math.cos(heading - omega * td / 2)
+                y += chord * math.sin(heading - omega * td / 2)
+                heading -= omega * td
+            heading = math.degrees(heading)
+        fleet.bank_angle[row] = bank_angle
+        fleet.heading[row] = heading % 360
+        fleet.x[row] = x
+        fleet.y[row] = y
+        fleet.oil[row] -= 1
+
     def get_oil(self):
         return self.oil
 
 
+class TrackHistory(object):
+    '''
+    固定容量的航迹环形缓存，用于绘图；
+    超过容量后覆盖最早的记录，内存占用不随训练时长增长
+    '''
+    def __init__(self, capacity, shape=(3,)):
+        '''
+        param:
+            capacity:   最多保存的记录数
+            shape:      每条记录的形状，单架飞机为 (3,)，n 架飞机为 (n, 3)
+        '''
+        self.capacity = capacity
+        self.buffer = np.zeros((capacity,) + tuple(shape))
+        self.ptr = 0
+        self.size = 0
+
+    def append(self, pos):
+        self.buffer[self.ptr] = pos
+        self.ptr = (self.ptr + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def clear(self):
+        self.ptr = 0
+        self.size = 0
+
+    def get(self):
+        '''
+        按时间顺序返回已保存的航迹 (size,) + shape
+        '''
+        if self.size < self.capacity:
+            return self.buffer[:self.size].copy()
+        return np.concatenate((self.buffer[self.ptr:], self.buffer[:self.ptr]))
+
+    def __len__(self):
+        return self.size
+
+
 class AircraftOverload(Aircraft):
-    def __init__(self, ac_speed=150):
+    def __init__(self, ac_speed=150, track_capacity=None):
         # 根据场景类型设置动作空间
         if args.envs_type == "2D_xy":
             self.action_space = ['s', 'l', 'r', 'a', 'd']
@@ -108,11 +411,9 @@ class AircraftOverload(Aircraft):
         self.ny = 1  # 过载
         self.nz = 0  # 过载
         self.nf = 5  # 法向过载
-        # 测试参数
-        self.list = []
-        self.x = []
-        self.y = []
-        self.z = []
+        # 绘图用航迹，track_capacity 为0时不记录
+        track_capacity = args.track_capacity if track_capacity is None else track_capacity
+        self.track = TrackHistory(track_capacity) if track_capacity > 0 else None
 
     def move(self, action):
         # 设置nx、ny、nz值
@@ -161,9 +462,8 @@ class AircraftOverload(Aircraft):
             self.ac_heading * math.pi / 180) * self.t
         self.ac_pos[2] = self.ac_pos[2] + self.ac_speed * math.sin(self.ac_pitch * math.pi / 180) * self.t
         # 绘图用参数
-        self.x.append(self.ac_pos[0])
-        self.y.append(self.ac_pos[1])
-        self.z.append(self.ac_pos[2])
+        if self.track is not None:
+            self.track.append(self.ac_pos)
 
     def move_overload(self, nx, ny, nz):
         # 计算t时刻后加速度、倾角变化率、偏角变化率
@@ -208,10 +508,8 @@ class AircraftOverload(Aircraft):
             self.ac_heading * math.pi / 180) * self.t
         self.ac_pos[2] = self.ac_pos[2] + self.ac_speed * math.sin(self.ac_pitch * math.pi / 180) * self.t
         # 绘图用参数
-        self.x.append(self.ac_pos[0])
-        self.y.append(self.ac_pos[1])
-        self.z.append(self.ac_pos[2])
-        pass
+        if self.track is not None:
+            self.track.append(self.ac_pos)
 
     def _get_rate(self, nx, ny, nz, pitch, v):
         """
@@ -289,11 +587,14 @@ class AircraftOverload(Aircraft):
             self.nx = -2
 
     def show(self, name):
+        if self.track is None:
+            raise Exception("AircraftOverload.show: track is not recorded, track_capacity must be > 0 to plot")
         from matplotlib import pyplot as plt
         from mpl_toolkits.mplot3d import Axes3D
+        track = self.track.get()
         fig = plt.figure()
         ax1 = plt.axes(projection='3d')
-        ax1.plot3D(self.x, self.y, self.z, 'gray')  # 绘制空间曲线
+        ax1.plot3D(track[:, 0], track[:, 1], track[:, 2], 'gray')  # 绘制空间曲线
         ax1.set_xlim([-1500, 1000])
         ax1.set_ylim([-1500, 1000])
         # ax1.set_zlim([5000-x, 5000+x])
@@ -301,10 +602,150 @@ class AircraftOverload(Aircraft):
         plt.show()
 
 
+class AircraftOverloadFleet(object):
+    '''
+    n 架 AircraftOverload 的批量过载动力学模型：
+        状态保存在 (12, n) 的连续数组 block 中，move / move_overload 一次推演全部飞机，
+        与 AircraftOverload.move / move_overload 的逻辑逐项对应。
+    '''
+    def __init__(self, n, ac_speed=150, track_capacity=None):
+        '''
+        param:
+            n:                  飞机数量
+            ac_speed:           初始速度，m/s
+            track_capacity:     航迹环形缓存容量，为0时不记录，默认使用 args.track_capacity
+        '''
+        if args.envs_type == "2D_xy":
+            self.action_space = ['s', 'l', 'r', 'a', 'd']
+        elif args.envs_type == "2D_xz":
+            self.action_space = ['s', 'u', 'n', 'a', 'd']
+        elif args.envs_type == "3D":
+            self.action_space = ['s', 'l', 'r', 'u', 'n', 'a', 'd']
+        else:
+            raise Exception("envs_type error")
+        self.n = n
+        self.block = np.zeros((12, n))
+        self.pos = self.block[0:3].T  # (n,3) 三维坐标
+        self.speed = self.block[3]
+        self.heading = self.block[4]  # 偏角
+        self.pitch = self.block[5]  # 倾角
+        self.roll = self.block[6]  # 滚转角
+        self.rate_roll = self.block[7]  # 滚转角变化率
+        self.nx = self.block[8]
+        self.ny = self.block[9]
+        self.nz = self.block[10]
+        self.oil = self.block[11]
+        self.pos[:, 2] = 5000.0
+        self.speed[:] = ac_speed
+        self.rate_roll[:] = 40
+        self.ny[:] = 1
+        self.oil[:] = args.Sum_Oil
+        self.ac_speed_min = 100
+        self.ac_speed_max = 300
+        self.ac_pitch_max = 60
+        self.roll_max = 80
+        self.nf = 5
+        self.t = args.map_t / args.map_t_n
+        self.G = args.G
+        track_capacity = args.track_capacity if track_capacity is None else track_capacity
+        self.track = TrackHistory(track_capacity, (n, 3)) if track_capacity > 0 else None
+
+    def __len__(self):
+        return self.n
+
+    def move(self, action):
+        '''
+        param:
+            action:     全部飞机的机动动作(n,)，取值 [0~6]
+        '''
+        action = np.asarray(action)
+        self._overload(action)
+        self._integrate(self.nx, self.ny, self.nz, action)
+
+    def move_overload(self, nx, ny, nz):
+        '''
+        param:
+            nx, ny, nz:  全部飞机的过载(n,)
+        '''
+        self._integrate(np.asarray(nx, dtype=np.float64), np.asarray(ny, dtype=np.float64),
+                        np.asarray(nz, dtype=np.float64), None)
+
+    def _overload(self, action):
+        '''
+        AircraftOverload._overload 的批量版本，原地设置 nx、ny、nz 和 rate_roll
+        '''
+        roll_rad = self.roll * (math.pi / 180)
+        pitch_rad = self.pitch * (math.pi / 180)
+        cos_roll = np.cos(roll_rad)
+        sin_pitch = np.sin(pitch_rad)
+        level = self.pitch == 0
+        # 检查滚转角、倾角、nz
+        rate_roll = np.where(self.roll < 0, 40.0, np.where(self.roll > 0, -40.0, 0.0))
+        ny = np.where(self.pitch < 0, self.nf * cos_roll,
+                      np.where(self.pitch > 0, -self.nf * cos_roll, np.cos(pitch_rad)))
+        nz = np.where(level, 0.0, self.nf * np.sin(roll_rad))
+        # 机动动作
+        turn = (action == 1) | (action == 2)
+        nz_turn = np.sqrt(np.maximum(self.nf * self.nf - ny * ny, 0))
+        nz = np.where(turn & level, np.where(action == 1, -nz_turn, nz_turn), nz)
+        rate_roll = np.where(action == 1, -40.0, np.where(action == 2, 40.0, rate_roll))
+        ny = np.where(action == 3, self.nf * cos_roll, np.where(action == 4, -self.nf * cos_roll, ny))
+        self.nx[:] = np.where(action <= 4, sin_pitch,
+                              np.where(action == 5, 2.0, np.where(action == 6, -2.0, self.nx)))
+        self.ny[:] = ny
+        self.nz[:] = nz
+        self.rate_roll[:] = rate_roll
+
+    def _integrate(self, nx, ny, nz, action):
+        '''
+        param:
+            nx, ny, nz:     过载(n,)
+            action:         机动动作(n,)；为 None 时对应 move_overload，倾角双向限幅
+        主要逻辑：
+            批量计算 _get_rate，并更新速度、倾角、偏角、滚转角和坐标
+        '''
+        t = self.t
+        pitch_rad = self.pitch * (math.pi / 180)
+        cos_pitch = np.cos(pitch_rad)
+        # 加速度、倾角变化率、偏角变化率
+        a = self.G * (nx - np.sin(pitch_rad))
+        rate_pitch = (ny - cos_pitch) * self.G / self.speed
+        vertical = np.abs(self.pitch) == 90
+        rate_heading = np.where(vertical, 0.0, nz * self.G / (self.speed * np.where(vertical, 1.0, cos_pitch)))
+        # 速度
+        np.clip(self.speed + a * t, self.ac_speed_min, self.ac_speed_max, out=self.speed)
+        # 倾角：变化前后异号则归零
+        pitch = self.pitch + rate_pitch * 180 * t / math.pi
+        pitch[self.pitch * pitch < 0] = 0
+        if action is None:
+            np.clip(pitch, -self.ac_pitch_max, self.ac_pitch_max, out=pitch)
+        else:
+            pitch = np.where(action == 3, np.minimum(pitch, self.ac_pitch_max),
+                             np.where(action == 4, np.maximum(pitch, -self.ac_pitch_max), pitch))
+        self.pitch[:] = pitch
+        # 偏角
+        heading = self.heading + rate_heading * 180 * t / math.pi
+        self.heading[:] = np.where(heading > 180, heading - 360, np.where(heading < -180, heading + 360, heading))
+        # 滚转角：限幅，变化前后异号则归零
+        roll = np.clip(self.roll + self.rate_roll * t, -self.roll_max, self.roll_max)
+        roll[self.roll * roll < 0] = 0
+        self.roll[:] = roll
+        # 坐标
+        pitch_rad = self.pitch * (math.pi / 180)
+        heading_rad = self.heading * (math.pi / 180)
+        v_xy = self.speed * np.cos(pitch_rad) * t
+        self.pos[:, 0] += v_xy * np.cos(heading_rad)
+        self.pos[:, 1] += -1 * v_xy * np.sin(heading_rad)
+        self.pos[:, 2] += self.speed * np.sin(pitch_rad) * t
+        # 绘图用参数
+        if self.track is not None:
+            self.track.append(self.pos)
+
+
 REGISTRY = {"default": AircraftDefault, "overload": AircraftOverload}
 
 if __name__ == '__main__':
-    aircraft = AircraftOverload()
+    aircraft = AircraftOverload(track_capacity=1000)
     for a in range(29):
         for i in range(5):
             aircraft.move(1)
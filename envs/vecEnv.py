@@ -0,0 +1,281 @@
+#!usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+多进程向量化环境：
+    SubprocVecEnv 在 n_workers 个子进程中运行 n_envs 个 envs.make(name) 环境（airCombate、guidence 等），
+    状态、奖励、done 由子进程直接写入共享内存中的 numpy 数组，主进程零拷贝读取；
+    某个环境 done 后由子进程自动重置，结束时刻的状态保存在 terminal 缓存中。
+    除同步接口外还提供 envpool 式的异步接口 async_reset / send / recv：
+        recv 返回已经就绪的一批环境（附带环境序号），send 只向这些环境发送动作，
+        episode 长短不一时策略网络不必等待最慢的子进程。
+'''
+import multiprocessing as mp
+from multiprocessing.connection import wait
+import numpy as np
+
+from argument.argManage import args
+
+
+def _shared_array(ctx, shape, dtype):
+    '''
+    分配进程间共享的内存块，返回 (RawArray, shape, dtype)，由 _as_array 转换为 numpy 数组
+    '''
+    dtype = np.dtype(dtype)
+    raw = ctx.RawArray('b', int(np.prod(shape)) * dtype.itemsize)
+    return raw, shape, dtype
+
+
+def _as_array(block):
+    raw, shape, dtype = block
+    return np.frombuffer(raw, dtype=dtype).reshape(shape)
+
+
+def _env_reset(env, self_play):
+    if self_play:
+        return env.reset_selfPlay()
+    return (env.reset(),)
+
+
+def _env_step(env, self_play, action):
+    '''
+    return:
+        (各方状态), (各方奖励), done
+    '''
+    if self_play:
+        s_b, s_r, reward_b, reward_r, done = env.step_selfPlay(action[0], action[1])
+        return (s_b, s_r), (reward_b, reward_r), done
+    s, reward, done = env.step(action[0])
+    return (s,), (reward,), done
+
+
+def _worker(remote, parent_remote, name, lo, hi, worker_id, blocks, args_dict):
+    '''
+    子进程：负责第 [lo, hi) 个环境
+        接收 ('step', ids) / ('reset', ids) / ('close', None) 命令，ids 为子进程内的环境序号（None 为全部），
+        动作从共享内存读取，结果写回共享内存，完成后回复处理过的 ids
+    '''
+    parent_remote.close()
+    # 子进程使用主进程的参数（spawn 方式启动时不会继承主进程中修改过的 args）
+    args.__dict__.update(args_dict)
+    np.random.seed((args.seed + worker_id) % (2 ** 32))
+    from envs import make
+    env_list = [make(name) for _ in range(lo, hi)]
+    self_play = hasattr(env_list[0], 'step_selfPlay')
+    state, terminal, reward, done, success, action = [_as_array(block)[lo:hi] for block in blocks]
+    try:
+        while True:
+            cmd, ids = remote.recv()
+            if ids is None:
+                ids = np.arange(len(env_list))
+            if cmd == 'step':
+                for k in ids:
+                    env = env_list[k]
+                    s, r, d = _env_step(env, self_play, action[k])
+                    state[k] = terminal[k] = s
+                    reward[k] = r
+                    done[k] = d
+                    if d:
+                        success[k] = env.success
+                        state[k] = _env_reset(env, self_play)
+            elif cmd == 'reset':
+                for k in ids:
+                    state[k] = _env_reset(env_list[k], self_play)
+                    reward[k] = 0
+                    done[k] = False
+                    success[k] = 0
+            elif cmd == 'close':
+                break
+            else:
+                raise Exception("SubprocVecEnv command error: %s" % cmd)
+            remote.send(ids)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        remote.close()
+
+
+class SubprocVecEnv(object):
+    '''
+    多进程向量化环境，接口与被包装的环境一致，输入输出第一维为环境序号：
+        自博弈环境（有 step_selfPlay，如 airCombate）：reset_selfPlay / step_selfPlay
+        单智能体环境（如 guidence）：reset / step
+    注意：返回的状态、奖励、done 是共享内存的视图，下一次 step 时会被覆盖，需要保留时请 copy。
+    异步接口（与同步接口不能混用）：
+        async_reset()
+        while ...:
+            env_ids, s_b, s_r, reward_b, reward_r, done = env.recv()   # 单智能体环境为 env_ids, s, reward, done
+            env.send((action_b, action_r), env_ids)                     # 单智能体环境为 env.send(action, env_ids)
+    '''
+    def __init__(self, name, n_envs=None, n_workers=None, dtype=np.float32):
+        '''
+        param:
+            name:           envs.REGISTRY 中的环境名
+            n_envs:         环境数量，默认 args.n_envs
+            n_workers:      子进程数量，默认 args.n_workers，0 为 CPU 核数（不超过 n_envs）
+            dtype:          共享内存中状态的数据类型
+        '''
+        from envs import make
+        self.n_envs = args.n_envs if n_envs is None else n_envs
+        n_workers = args.n_workers if n_workers is None else n_workers
+        self.n_workers = min(n_workers if n_workers > 0 else mp.cpu_count(), self.n_envs)
+
+        # 在主进程中构建一个环境以获得接口信息
+        env = make(name)
+        self.self_play = hasattr(env, 'step_selfPlay')
+        self.n_sides = 2 if self.self_play else 1
+        self.state_dim = env.state_dim
+        self.action_dim = env.action_dim
+        self.n_actions = env.n_actions
+
+        ctx = mp.get_context('fork' if 'fork' in mp.get_all_start_methods() else 'spawn')
+        n, m = self.n_envs, self.n_sides
+        blocks = [_shared_array(ctx, (n, m, self.state_dim), dtype),  # 状态
+                  _shared_array(ctx, (n, m, self.state_dim), dtype),  # 结束时刻的状态
+                  _shared_array(ctx, (n, m), np.float64),  # 奖励
+                  _shared_array(ctx, (n,), np.bool_),  # done
+                  _shared_array(ctx, (n,), np.int64),  # success
+                  _shared_array(ctx, (n, m), np.int64)]  # 动作
+        self.state, self.terminal, self.reward, self.done, self.success, self.action = \
+            [_as_array(block) for block in blocks]
+
+        # 环境按连续区间分配给各子进程
+        bounds = np.linspace(0, n, self.n_workers + 1).astype(int)
+        self.env_slices = [slice(bounds[i], bounds[i + 1]) for i in range(self.n_workers)]
+        self.remotes, self.processes = [], []
+        for worker_id, sl in enumerate(self.env_slices):
+            remote, work_remote = ctx.Pipe()
+            process = ctx.Process(target=_worker, args=(work_remote, remote, name, sl.start, sl.stop, worker_id,
+                                                         blocks, vars(args)), daemon=True)
+            process.start()
+            work_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+        self.env_worker = np.repeat(np.arange(self.n_workers), np.diff(bounds))  # 每个环境所属的子进程
+        self.n_pending = np.zeros(self.n_workers, dtype=np.int64)  # 每个子进程尚未回复的异步命令数
+        self.batch_size = args.async_batch_size
+        self.closed = False
+
+    def _call(self, cmd):
+        if self.n_pending.any():
+            raise Exception("SubprocVecEnv: synchronous call while async commands are pending")
+        for remote in self.remotes:
+            remote.send((cmd, None))
+        for remote in self.remotes:
+            remote.recv()
+
+    def _reset(self):
+        self._call('reset')
+
+    def _step(self, *actions):
+        for side, action in enumerate(actions):
+            self.action[:, side] = action
+        self._call('step')
+
+    # 自博弈环境接口
+    def reset_selfPlay(self):
+        self._reset()
+        return self.state[:, 0], self.state[:, 1]
+
+    def step_selfPlay(self, action_b, action_r):
+        '''
+        return:
+            s_b, s_r, reward_b, reward_r, done；done 的环境已自动重置，结束时刻的状态见 terminal_s_b / terminal_s_r
+        '''
+        self._step(action_b, action_r)
+        return self.state[:, 0], self.state[:, 1], self.reward[:, 0], self.reward[:, 1], self.done
+
+    @property
+    def terminal_s_b(self):
+        return self.terminal[:, 0]
+
+    @property
+    def terminal_s_r(self):
+        return self.terminal[:, 1]
+
+    # 单智能体环境接口
+    def reset(self):
+        self._reset()
+        return self.state[:, 0]
+
+    def step(self, action):
+        '''
+        return:
+            s, reward, done；done 的环境已自动重置，结束时刻的状态见 terminal_s
+        '''
+        self._step(action)
+        return self.state[:, 0], self.reward[:, 0], self.done
+
+    @property
+    def terminal_s(self):
+        return self.terminal[:, 0]
+
+    # 异步接口
+    def async_reset(self):
+        '''
+        向全部子进程发送 reset，结果由 recv 返回
+        '''
+        self._send('reset', np.arange(self.n_envs))
+
+    def send(self, action, env_ids):
+        '''
+        param:
+            action:     自博弈环境为 (action_b, action_r)，单智能体环境为 action，第一维与 env_ids 对应
+            env_ids:    上一次 recv 返回的环境序号
+        '''
+        env_ids = np.asarray(env_ids)
+        actions = action if self.self_play else (action,)
+        for side, a in enumerate(actions):
+            self.action[env_ids, side] = a
+        self._send('step', env_ids)
+
+    def recv(self, batch_size=None):
+        '''
+        param:
+            batch_size:     至少等待多少个环境就绪，默认 args.async_batch_size，0 为任一子进程就绪即返回
+        return:
+            env_ids 及对应环境的 状态、奖励、done（为拷贝，不会被之后的 step 覆盖）；
+            done 的环境已自动重置，结束时刻的状态为 terminal_s_b[env_ids] 等（在下一次 send 之前有效）
+        '''
+        batch_size = self.batch_size if batch_size is None else batch_size
+        batch_size = min(max(batch_size, 1), self.n_envs)
+        ready = []
+        n_ready = 0
+        while n_ready < batch_size and self.n_pending.any():
+            waiting = [self.remotes[i] for i in np.flatnonzero(self.n_pending)]
+            for remote in wait(waiting):
+                worker = self.remotes.index(remote)
+                ids = remote.recv() + self.env_slices[worker].start
+                self.n_pending[worker] -= 1
+                ready.append(ids)
+                n_ready += len(ids)
+        if not ready:
+            raise Exception("SubprocVecEnv: recv without pending send")
+        env_ids = np.concatenate(ready)
+        state, reward, done = self.state[env_ids], self.reward[env_ids], self.done[env_ids]
+        if self.self_play:
+            return env_ids, state[:, 0], state[:, 1], reward[:, 0], reward[:, 1], done
+        return env_ids, state[:, 0], reward[:, 0], done
+
+    def _send(self, cmd, env_ids):
+        workers = self.env_worker[env_ids]
+        for worker in np.unique(workers):
+            self.remotes[worker].send((cmd, env_ids[workers == worker] - self.env_slices[worker].start))
+            self.n_pending[worker] += 1
+
+    def close(self):
+        if self.closed:
+            return
+        for worker, remote in enumerate(self.remotes):
+            for _ in range(self.n_pending[worker]):
+                remote.recv()
+            remote.send(('close', None))
+        for process in self.processes:
+            process.join()
+        self.closed = True
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
@@ -5,6 +5,7 @@ import sys
 sys.path.append('..')
 #from argument.dqnArgs import args
 from argument.argManage import args
+import common.alloc as alloc
 
 def run_NFSP(env, agent_blue, agent_red):
     if args.flag_is_train:
@@ -14,21 +15,25 @@ def run_NFSP(env, agent_blue, agent_red):
             
             
             state_blue, state_red = env.reset_selfPlay()
+            memory_blue = alloc.memory_state(env, state_blue, 'blue')
+            memory_red = alloc.memory_state(env, state_red, 'red')
             while True:
                 action_blue, is_best_response_blue = agent_blue.NFSP_action(state_blue)
                 action_red,  is_best_response_red  = agent_red.NFSP_action(state_red)
 
                 # store data for SL for training average stragery
                 if is_best_response_blue:
-                    agent_blue.buffer_sl.store(state_blue, action_blue)
+                    agent_blue.store_data_sl(state_blue, action_blue)
                 if is_best_response_red:
-                    agent_red.buffer_sl.store(state_red, action_red)
+                    agent_red.store_data_sl(state_red, action_red)
 
                 next_state_blue, next_state_red, reward_blue, reward_red, done = env.step_selfPlay(action_blue, action_red)
 
                 # todo: both reward_blue and reward_red should be given
-                agent_blue.buffer_rl.store(state_blue, action_blue, reward_blue, next_state_blue, done)
-                agent_red.buffer_rl.store(state_red, action_red, reward_red, next_state_red, done)
+                next_memory_blue = alloc.memory_state(env, next_state_blue, 'blue')
+                next_memory_red = alloc.memory_state(env, next_state_red, 'red')
+                agent_blue.store_data_rl(memory_blue, action_blue, reward_blue, next_memory_blue, done)
+                agent_red.store_data_rl(memory_red, action_red, reward_red, next_memory_red, done)
 
                 if len(agent_blue.buffer_rl) > args.batch_size * 4:
                     agent_blue.train_rl()
@@ -41,6 +46,7 @@ def run_NFSP(env, agent_blue, agent_red):
                     agent_red.train_sl()
 
                 state_blue, state_red = next_state_blue, next_state_red
+                memory_blue, memory_red = next_memory_blue, next_memory_red
                 if done:
                     break
 
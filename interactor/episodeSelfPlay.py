@@ -1,11 +1,13 @@
 #!usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import os
 import sys
 import json
 import xlwt
 sys.path.append('..')
 import common.alloc as alloc
+from memoryBuffer.warmCache import warm_cache_file, save_warm_cache, load_warm_cache
 
 import logger
 
@@ -47,36 +49,50 @@ def run_AirCombat_selfPlay(env, train_agent, use_agent, train_agent_name):
     if train_agent.is_train:  # 训练模式(else:直接加载模型)
         suc_num = 0
 
-        # 经验池存储数据
+        # 经验池存储数据（配置相同时直接载入预热缓存）
         env.init_scen = 0
-        for episode in range(args.store):
-            # reset
-            state_train_agent, state_use_agent = alloc.env_reset(env, train_agent_name)
-
-            if episode % 100 == 0:
-                print('data collection: {} ,buffer capacity: {} '.format(episode / 100,
-                                                                         len(train_agent.replay_buffer)))
-            while True:
-                # action
-                # todo-levin: 修改 epsilon 递减机制
-                action_train_agent = train_agent.egreedy_action(state_train_agent, epsilon_decay=args.epsilon_decay_during_obser)
-                action_use_agent = use_agent.max_action(state_use_agent)
-                if levin_debug:
-                    action_use_agent = 2
+        cache_file = None
+        if args.flag_warm_cache:
+            cache_file = warm_cache_file(train_agent_name, use_agent.save_path + "/" + use_agent.checkpoint_folder_name
+                                         + "/" + use_agent.scope + use_agent.file_name)
+        if cache_file is not None and os.path.exists(cache_file):
+            n_cache = load_warm_cache(cache_file, train_agent)
+            print('load warm cache: {} ,samples: {} '.format(cache_file, n_cache))
+        else:
+            for episode in range(args.store):
+                # reset
+                state_train_agent, state_use_agent = alloc.env_reset(env, train_agent_name)
+                memory_state = alloc.memory_state(env, state_train_agent, train_agent_name)
+
+                if episode % 100 == 0:
+                    print('data collection: {} ,buffer capacity: {} '.format(episode / 100,
+                                                                             len(train_agent.replay_buffer)))
+                while True:
+                    # action
+                    # todo-levin: 修改 epsilon 递减机制
+                    action_train_agent = train_agent.egreedy_action(state_train_agent, epsilon_decay=args.epsilon_decay_during_obser)
+                    action_use_agent = use_agent.max_action(state_use_agent)
+                    if levin_debug:
+                        action_use_agent = 2
+
+                    # next_state
+                    next_state_train_agent, next_state_use_agent, reward_train_agent, done = alloc.env_step(env,
+                                                                                                            action_train_agent,
+                                                                                                            action_use_agent,
+                                                                                                            train_agent_name)
+                    next_memory_state = alloc.memory_state(env, next_state_train_agent, train_agent_name)
+                    train_agent.store_data(memory_state, action_train_agent, reward_train_agent,
+                                           next_memory_state, done)
+                    state_train_agent = next_state_train_agent
+                    memory_state = next_memory_state
+                    if done:
+                        break
 
-                # next_state
-                next_state_train_agent, next_state_use_agent, reward_train_agent, done = alloc.env_step(env,
-                                                                                                        action_train_agent,
-                                                                                                        action_use_agent,
-                                                                                                        train_agent_name)
-                train_agent.store_data(state_train_agent, action_train_agent, reward_train_agent,
-                                       next_state_train_agent, done)
-                state_train_agent = next_state_train_agent
-                if done:
+                if(len(train_agent.replay_buffer) >= args.observe_step):
                     break
 
-            if(len(train_agent.replay_buffer) >= args.observe_step):
-                break
+            if cache_file is not None:
+                save_warm_cache(cache_file, train_agent)
 
         # 开始训练
         for episode in range(args.episode):
@@ -84,6 +100,7 @@ def run_AirCombat_selfPlay(env, train_agent, use_agent, train_agent_name):
             e_reward = 0  # 总reward
             step = 0  # 总步长数
             state_train_agent, state_use_agent = alloc.env_reset(env, train_agent_name)
+            memory_state = alloc.memory_state(env, state_train_agent, train_agent_name)
             while True:
                 action_train_agent = train_agent.egreedy_action(state_train_agent)
                 action_use_agent = use_agent.max_action(state_use_agent)
@@ -94,8 +111,10 @@ def run_AirCombat_selfPlay(env, train_agent, use_agent, train_agent_name):
                                                                                             train_agent_name)
 
                 e_reward += reward
-                train_agent.perceive(state_train_agent, action_train_agent, reward, next_state_train_agent, done)
+                next_memory_state = alloc.memory_state(env, next_state_train_agent, train_agent_name)
+                train_agent.perceive(memory_state, action_train_agent, reward, next_memory_state, done)
                 state_train_agent = next_state_train_agent
+                memory_state = next_memory_state
                 step += 1
 
                 if done:
@@ -0,0 +1,14 @@
+from memoryBuffer.replayBuffer import ReplayBuffer, PrioritizedReplayBuffer, MemmapReplayBuffer, CompactReplayBuffer, \
+    PoseReplayBuffer
+from memoryBuffer.trajBuffer import TrajBuffer
+from memoryBuffer.sharedBuffer import SharedReplayBuffer
+
+# 经验池类型，由 argument/memory/memory.yaml 中的 memory_type 选择
+REGISTRY = {}
+REGISTRY["replay"] = ReplayBuffer
+REGISTRY["prioritized"] = PrioritizedReplayBuffer
+REGISTRY["memmap"] = MemmapReplayBuffer
+REGISTRY["compact"] = CompactReplayBuffer
+REGISTRY["pose"] = PoseReplayBuffer
+REGISTRY["traj"] = TrajBuffer
+REGISTRY["shared"] = SharedReplayBuffer
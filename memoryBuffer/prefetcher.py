@@ -0,0 +1,108 @@
+#!usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+后台预取训练 batch：
+    后台线程提前从经验池中采样 n_prefetch 个 batch，由经验池直接写入一组可重复使用的张量（有 GPU 时为 pinned memory），
+    训练时直接取出张量，采样和类型转换与上一次网络更新（torch 计算时释放 GIL）并行执行。
+'''
+import queue
+import threading
+import numpy as np
+import torch
+import sys
+sys.path.append("..")
+import common.utlis as U
+
+
+class Prefetcher(object):
+    '''
+    用法：
+        prefetcher = Prefetcher(buffer, batch_size, n_prefetch, lock)
+        tensors, batch = next(prefetcher)
+            tensors:    state, action, reward, next_state, done 的张量（有 GPU 时已在 GPU 上），
+                        在下一次 next 之前有效
+            batch:      与 buffer.sample 的返回值相同（前 5 列为与张量共享内存的 numpy 数组，
+                        优先经验回放的 权重、序号 等在 batch[5:] 中）
+    经验池的 store 等操作与后台采样需要使用同一个 lock。
+    '''
+    def __init__(self, buffer, batch_size, n_prefetch, lock=None):
+        self.buffer = buffer
+        self.batch_size = batch_size
+        self.lock = threading.Lock() if lock is None else lock
+        self.pin = U.is_cuda()
+        n_slot = n_prefetch + 1  # 另有一组张量正在被训练使用
+        self.slots = [None] * n_slot  # 每组为 5 个张量，第一次使用时按 batch 的形状分配
+        self.arrays = [None] * n_slot  # 与 slots 共享内存的 numpy 数组
+        self.events = [None] * n_slot  # 该组张量拷贝到 GPU 完成的事件，完成前不能覆盖
+        self.free = queue.Queue()
+        for slot in range(n_slot):
+            self.free.put(slot)
+        self.ready = queue.Queue()
+        self.in_use = None
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                slot = self.free.get()
+                if slot is None:
+                    return
+                if self.events[slot] is not None:
+                    self.events[slot].synchronize()
+                with self.lock:
+                    if self.slots[slot] is None:
+                        batch = self.buffer.sample(self.batch_size)
+                        self._allocate(slot, batch)
+                        extra = tuple(batch[5:])
+                    else:
+                        extra = self.buffer.sample_into(self.batch_size, self.arrays[slot])
+                self.ready.put((slot, tuple(self.arrays[slot]) + extra))
+        except Exception as e:
+            self.ready.put(e)
+
+    def _allocate(self, slot, batch):
+        columns = [np.asarray(column) for column in batch[:5]]
+        self.slots[slot] = [self._empty(column) for column in columns]
+        self.arrays[slot] = [tensor.numpy() for tensor in self.slots[slot]]
+        for array, column in zip(self.arrays[slot], columns):
+            array[...] = column
+
+    def _empty(self, column):
+        dtype = torch.int64 if np.issubdtype(column.dtype, np.integer) else torch.float32
+        tensor = torch.empty(column.shape, dtype=dtype)
+        return tensor.pin_memory() if self.pin else tensor
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.in_use is not None:
+            self.free.put(self.in_use)
+            self.in_use = None
+        item = self.ready.get()
+        if isinstance(item, Exception):
+            raise item
+        slot, batch = item
+        self.in_use = slot
+        tensors = self.slots[slot]
+        if self.pin:
+            tensors = [tensor.cuda(non_blocking=True) for tensor in tensors]
+            self.events[slot] = torch.cuda.Event()
+            self.events[slot].record()
+        return tensors, batch
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.free.put(None)
+        self.thread.join()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
@@ -5,6 +5,8 @@
 DQN中使用的经验缓存池
 '''
 import collections
+import json
+import os
 import numpy as np
 import random
 import sys
@@ -40,9 +42,29 @@ class Buffer(object):
         '''
         raise NotImplementedError
 
+    def store_batch(self, *batch):
+        '''
+        一次存入一批样本，参数与 store 相同，每个参数第一维为样本序号；
+        默认逐个调用 store，子类中可以重写为整块写入
+        '''
+        for sample in zip(*batch):
+            self.store(*sample)
+
     def sample(self, batch_size):
         raise NotImplementedError
 
+    def sample_into(self, batch_size, out):
+        '''
+        与 sample 相同，但将前 len(out) 列写入预先分配的数组 out（如训练时复用的 float32 / int64 数组）
+        return:
+            sample 的其余返回值（如优先经验回放的 weights, idx）
+        默认调用 sample 后拷贝，子类中可以重写为直接写入
+        '''
+        batch = self.sample(batch_size)
+        for array, column in zip(out, batch):
+            array[...] = column
+        return tuple(batch[len(out):])
+
     def pop(self):
         self.replay_buffer.pop(0)
 
@@ -53,25 +75,20 @@ class Buffer(object):
         '''
         self.size = len(self.replay_buffer)
 
-    def _piexl_processing(state, next_state):
+    def _piexl_processing(self, state):
         '''
         当 state 为pixel类型时，即图像类型的状态（观察）；
         则 进行此处理，可以节约存储空间。
         同时，使用时需要对从buffer中采样(sample)的state进行逆处理。
         '''
+        # Class LazyFrame --> np.array()
+        state = np.asarray(state)
         assert np.amin(state) >= 0.0
         assert np.amax(state) <= 1.0
+        return (state * 255).round().astype(np.uint8)
 
-        # Class LazyFrame --> np.array()
-        state = np.array(state)
-        next_state = np.array(next_state)
-
-        state  = (state * 255).round().astype(np.uint8)
-        next_state = (next_state * 255).round().astype(np.uint8)
-
-    def _piexl_rev_processing(state, next_state):
-        state = state.astype(np.float32) / 255.0
-        next_state = next_state.astype(np.float32) / 255.0
+    def _piexl_rev_processing(self, state):
+        return state.astype(np.float32) / 255.0
 
     def __len__(self):
         return len(self.replay_buffer)
@@ -79,56 +96,556 @@ class Buffer(object):
 
 
 class ReplayBuffer(Buffer):
+    '''
+    环形数组实现的经验池：
+        state / action / reward / next_state / done 各保存在一列预分配的定长数组中（首次 store 时按状态形状分配），
+        写满后新样本覆盖最旧的样本，store 为 O(1)；
+        sample 一次花式索引取出整个 batch（有放回均匀采样）。
+    数据类型：状态 float32（flag_piexl 时为 uint8），动作 int64，奖励和 done 为 float32
+    '''
     def __init__(self, capacity, flag_piexl=0):
         super(ReplayBuffer, self).__init__(capacity, flag_piexl)
         self.Transition = collections.namedtuple("Transition", ["state","action","reward","next_state","done"])
+        self.state = self.action = self.reward = self.next_state = self.done = None
+        self.ptr = 0  # 下一个样本的写入位置
+        self.size = 0
+
+    def _allocate(self, state):
+        for name, shape, dtype in self._columns(np.shape(state)):
+            setattr(self, name, np.empty(shape, dtype=dtype))
+
+    def _columns(self, state_shape):
+        '''
+        各列的 (名字, 形状, 数据类型)
+        '''
+        shape = (self.capacity,) + tuple(state_shape)
+        state_dtype = np.uint8 if self.flag_piexl else np.float32
+        return [("state", shape, state_dtype), ("action", (self.capacity,), np.int64),
+                ("reward", (self.capacity,), np.float32), ("next_state", shape, state_dtype),
+                ("done", (self.capacity,), np.float32)]
 
     def store(self, state, action, reward, next_state, done):
-        if self.size > self.capacity:
-            self.replay_buffer.pop(0)
-            self._update_size()
+        if self.state is None:
+            self._allocate(state)
 
         if self.flag_piexl:
-            self._piexl_processing(state, next_state)
+            state = self._piexl_processing(state)
+            next_state = self._piexl_processing(next_state)
+
+        i = self.ptr
+        self.state[i] = state
+        self.action[i] = action
+        self.reward[i] = reward
+        self.next_state[i] = next_state
+        self.done[i] = done
+        self.ptr = (i + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+
+    def store_batch(self, states, actions, rewards, next_states, dones):
+        '''
+        整块写入一批样本：环形数组末尾放不下时分两段切片赋值，样本数超过容量时只保留最后 capacity 个
+        return:
+            样本写入的位置
+        '''
+        n = len(actions)
+        if n == 0:
+            return np.zeros(0, dtype=np.int64)
+        if self.state is None:
+            self._allocate(states[0])
+
+        if self.flag_piexl:
+            states = self._piexl_processing(states)
+            next_states = self._piexl_processing(next_states)
+
+        batch = [states, actions, rewards, next_states, dones]
+        if n > self.capacity:
+            self.ptr = (self.ptr + n - self.capacity) % self.capacity
+            batch = [np.asarray(column)[n - self.capacity:] for column in batch]
+            n = self.capacity
+        i = self.ptr
+        first = min(n, self.capacity - i)
+        for name, column in zip(["state", "action", "reward", "next_state", "done"], batch):
+            data = getattr(self, name)
+            column = np.asarray(column)
+            data[i:i + first] = column[:first]
+            data[:n - first] = column[first:]
+        self.ptr = (i + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+        return (i + np.arange(n)) % self.capacity
+
+    def sample(self, batch_size):
+        return self.transitions(self._sample_index(batch_size))
+
+    def _sample_index(self, batch_size):
+        assert self.size > batch_size
+        # 最旧的样本位于 ptr - size
+        return (self.ptr - self.size + np.random.randint(0, self.size, batch_size)) % self.capacity
+
+    def sample_into(self, batch_size, out):
+        if self.flag_piexl:
+            return super(ReplayBuffer, self).sample_into(batch_size, out)
+        self._take(self._sample_index(batch_size), out)
+        return ()
+
+    def _take(self, idx, out):
+        '''
+        按下标直接将各列写入 out（np.take 的 out 参数，不分配新的数组）
+        '''
+        for array, name in zip(out, ["state", "action", "reward", "next_state", "done"]):
+            np.take(getattr(self, name), idx, axis=0, out=array, mode="clip")  # mode="raise" 时 out 会经过临时数组
+
+    def transitions(self, idx):
+        '''
+        按数组下标取出样本（图像状态已逆处理为 float32）
+        return:
+            state, action, reward, next_state, done
+        '''
+        state, next_state = self.state[idx], self.next_state[idx]
+
+        if self.flag_piexl:
+            state = self._piexl_rev_processing(state)
+            next_state = self._piexl_rev_processing(next_state)
+
+        return state, self.action[idx], self.reward[idx], next_state, self.done[idx]
+
+    def export(self, idx):
+        '''
+        按数组下标取出可以重新 store 的样本（用于预热缓存），默认与 transitions 相同
+        '''
+        return self.transitions(idx)
+
+    def pop(self):
+        '''
+        丢弃最旧的样本（环形数组写满后会自动覆盖最旧样本，一般不需要调用）
+        '''
+        if self.size > 0:
+            self.size -= 1
+
+    def __len__(self):
+        return self.size
+
+
+class SumTree(object):
+    '''
+    数组实现的求和树：叶子为 capacity 个样本的优先级，内部节点为子节点之和（tree[1] 为总和）
+        update 和 find 均为批量操作，每层一次向量化计算，复杂度 O(batch · log n)
+    '''
+    def __init__(self, capacity):
+        self.n_leaf = 1
+        while self.n_leaf < capacity:
+            self.n_leaf *= 2
+        self.depth = int(np.log2(self.n_leaf))
+        self.tree = np.zeros(2 * self.n_leaf)
+
+    def total(self):
+        return self.tree[1]
+
+    def update(self, idx, priority):
+        '''
+        将样本 idx 的优先级设为 priority（idx 可重复，取最后一次的值）
+        '''
+        node = np.asarray(idx) + self.n_leaf
+        self.tree[node] = priority
+        for _ in range(self.depth):
+            # 重复的节点写入相同的值，不需要去重
+            node = node // 2
+            self.tree[node] = self.tree[2 * node] + self.tree[2 * node + 1]
+
+    def find(self, value):
+        '''
+        返回前缀和首次超过 value 的样本序号
+        只进入和大于 0 的子树：浮点舍入可能使 value 超过右子树的和，此时仍落在优先级大于 0 的样本上
+        '''
+        value = np.array(value, dtype=np.float64)
+        node = np.ones(len(value), dtype=np.int64)
+        for _ in range(self.depth):
+            left = 2 * node
+            go_right = ((value >= self.tree[left]) & (self.tree[left + 1] > 0)) | (self.tree[left] <= 0)
+            value -= np.where(go_right, self.tree[left], 0)
+            node = left + go_right
+        return node - self.n_leaf
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    '''
+    优先经验回放（Prioritized Experience Replay）：
+        样本被采样的概率正比于 priority^alpha，新样本使用当前最大优先级；
+        sample 额外返回重要性采样权重（按 batch 内最大值归一化）和样本序号，
+        训练后调用 update_priorities(idx, td_error) 批量更新优先级。
+    参数见 argument/memory/memory.yaml：per_alpha, per_beta, per_beta_steps, per_eps
+    '''
+    def __init__(self, capacity, flag_piexl=0):
+        super(PrioritizedReplayBuffer, self).__init__(capacity, flag_piexl)
+        self.alpha = args.per_alpha
+        self.beta = args.per_beta
+        self.beta_increment = (1.0 - args.per_beta) / max(args.per_beta_steps, 1)  # beta 线性增加到 1
+        self.eps = args.per_eps
+        self.max_priority = 1.0
+        self.sum_tree = SumTree(capacity)
+
+    def store(self, state, action, reward, next_state, done):
+        i = self.ptr
+        super(PrioritizedReplayBuffer, self).store(state, action, reward, next_state, done)
+        self.sum_tree.update([i], self.max_priority ** self.alpha)
+
+    def store_batch(self, states, actions, rewards, next_states, dones):
+        idx = super(PrioritizedReplayBuffer, self).store_batch(states, actions, rewards, next_states, dones)
+        self.sum_tree.update(idx, self.max_priority ** self.alpha)
+        return idx
 
-        self.replay_buffer.append(self.Transition(state, action, reward, next_state, float(done)))
-        self._update_size()
- 
     def sample(self, batch_size):
-        assert len(self.replay_buffer) > batch_size
-        batch_transition = random.sample(self.replay_buffer, batch_size)
-        state, action, reward, next_state, done = map(np.array, zip(*batch_transition))
+        '''
+        分层采样：将优先级总和均分为 batch_size 段，每段内均匀采样一个样本
+        return:
+            state, action, reward, next_state, done, weights, idx
+        '''
+        weights, idx = self._sample_priority(batch_size)
+        return self.transitions(idx) + (weights, idx)
+
+    def sample_into(self, batch_size, out):
+        if self.flag_piexl:
+            return Buffer.sample_into(self, batch_size, out)
+        weights, idx = self._sample_priority(batch_size)
+        self._take(idx, out)
+        return weights, idx
+
+    def _sample_priority(self, batch_size):
+        '''
+        return:
+            重要性采样权重 weights 和样本序号 idx
+        '''
+        assert self.size > batch_size
+        total = self.sum_tree.total()
+        value = (np.arange(batch_size) + np.random.rand(batch_size)) * (total / batch_size)
+        idx = self.sum_tree.find(np.minimum(value, total * (1 - 1e-12)))
+        prob = self.sum_tree.tree[idx + self.sum_tree.n_leaf] / total
+        weights = (self.size * prob) ** (-self.beta)
+        weights = (weights / weights.max()).astype(np.float32)
+        self.beta = min(1.0, self.beta + self.beta_increment)
+        return weights, idx
+
+    def update_priorities(self, idx, td_error):
+        priority = np.abs(td_error) + self.eps
+        self.max_priority = max(self.max_priority, float(priority.max()))
+        self.sum_tree.update(idx, priority ** self.alpha)
+
+    def pop(self):
+        if self.size > 0:
+            self.sum_tree.update([(self.ptr - self.size) % self.capacity], 0)
+        super(PrioritizedReplayBuffer, self).pop()
+
+
+class MemmapReplayBuffer(ReplayBuffer):
+    '''
+    保存在磁盘上的环形经验池：
+        各列为 path（DQN 中为 save_path/memmap_dir/<scope>）下的 .npy 内存映射文件（np.memmap），容量可以远大于内存；
+        内存中只保存写入位置 ptr 和样本数 size，每 memmap_flush_every 次 store 刷新一次文件并写入 meta.json，
+        进程意外退出后再次创建同一目录的经验池会直接打开已有文件，恢复到最近一次刷新时的状态。
+    采样：
+        memmap_chunk = 0：均匀采样，下标排序后读取，使同一页内的样本一起读入
+        memmap_chunk > 0：随机选取 batch_size / memmap_chunk 段连续的 memmap_chunk 个样本，顺序读取，
+                          大幅减少随机读的页数（样本之间有一定相关性）
+    '''
+    def __init__(self, capacity, flag_piexl=0, path=None):
+        super(MemmapReplayBuffer, self).__init__(capacity, flag_piexl)
+        self.path = os.path.join(args.save_path, args.memmap_dir) if path is None else path
+        self.chunk = args.memmap_chunk
+        self.flush_every = args.memmap_flush_every
+        self.meta_file = os.path.join(self.path, "meta.json")
+        self.n_store = 0
+        if os.path.exists(self.meta_file):
+            self._reopen()
 
+    def _reopen(self):
+        with open(self.meta_file, 'r') as f:
+            meta = json.load(f)
+        if meta["capacity"] != self.capacity or bool(meta["flag_piexl"]) != bool(self.flag_piexl):
+            raise Exception("MemmapReplayBuffer: %s was created with different capacity/flag_piexl" % self.path)
+        for name, _, _ in self._columns(meta["state_shape"]):
+            setattr(self, name, np.load(os.path.join(self.path, name + ".npy"), mmap_mode='r+'))
+        self.ptr = meta["ptr"]
+        self.size = meta["size"]
+
+    def _allocate(self, state):
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        for name, shape, dtype in self._columns(np.shape(state)):
+            setattr(self, name, np.lib.format.open_memmap(os.path.join(self.path, name + ".npy"), mode='w+',
+                                                          dtype=dtype, shape=shape))
+        self.flush()
+
+    def store(self, state, action, reward, next_state, done):
+        super(MemmapReplayBuffer, self).store(state, action, reward, next_state, done)
+        self.n_store += 1
+        if self.n_store % self.flush_every == 0:
+            self.flush()
+
+    def store_batch(self, states, actions, rewards, next_states, dones):
+        idx = super(MemmapReplayBuffer, self).store_batch(states, actions, rewards, next_states, dones)
+        n_flush = self.n_store // self.flush_every
+        self.n_store += len(actions)
+        if self.n_store // self.flush_every > n_flush:
+            self.flush()
+        return idx
+
+    def _sample_index(self, batch_size):
+        assert self.size > batch_size
+        oldest = self.ptr - self.size
+        if self.chunk > 0:
+            chunk = min(self.chunk, batch_size)
+            n_chunk = -(-batch_size // chunk)
+            start = np.random.randint(0, self.size - chunk + 1, n_chunk)
+            offset = (start[:, None] + np.arange(chunk)).ravel()[:batch_size]
+        else:
+            offset = np.random.randint(0, self.size, batch_size)
+        return np.sort((oldest + offset) % self.capacity)
+
+    def flush(self):
+        '''
+        将数据写回磁盘，再原子地更新 meta.json（先写数据后写 meta，保证 meta 中的 size 范围内数据完整）
+        '''
+        if self.state is None:
+            return
+        for name, _, _ in self._columns(self.state.shape[1:]):
+            getattr(self, name).flush()
+        meta = {"capacity": self.capacity, "flag_piexl": int(self.flag_piexl), "ptr": self.ptr, "size": self.size,
+                "state_shape": list(self.state.shape[1:])}
+        tmp_file = self.meta_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_file, self.meta_file)
+
+
+class CompactReplayBuffer(ReplayBuffer):
+    '''
+    压缩存储的环形经验池：
+        1. 状态只存一次：第 i 个样本的 next_state 保存在 obs[i]，
+           若它的 state 与上一个样本的 next_state 相同（同一局中连续的两步），则 state 即 obs[i-1]，不再保存；
+           每局第一个样本的 state 单独保存在 first_state 字典中（每局一个）。
+           最旧的样本被覆盖时，其 next_state 若被下一个样本引用，则先移入 first_state。
+        2. 量化（compact_dtype）：
+            float32:    不量化
+            float16:    半精度
+            int16:      按状态各维的取值范围（customization.REGISTRY_STATE_BOUND[state_setting]）线性量化，
+                        超出范围的值被截断
+           sample 时解码为 float32。图像状态（flag_piexl）仍使用 uint8。
+    与 ReplayBuffer（float32 的 state 和 next_state）相比，float16/int16 约节省 4 倍内存。
+    '''
+    def __init__(self, capacity, flag_piexl=0, dtype=None, state_bound=None):
+        '''
+        param:
+            dtype:          量化类型，默认 args.compact_dtype
+            state_bound:    int16 量化时状态各维绝对值的上界，默认按 args.state_setting 取值
+        '''
+        super(CompactReplayBuffer, self).__init__(capacity, flag_piexl)
+        self.dtype = np.dtype(args.compact_dtype if dtype is None else dtype)
+        self.state_bound = state_bound
+        self.scale = None  # int16 量化时的解码系数
+        self.obs = None
+        self.linked = None  # linked[i]：第 i 个样本的 state 为 obs[i-1]
+        self.first_state = {}
+        self.last_next_state = None  # 上一次 store 的 next_state（未编码），用于判断是否与当前 state 相同
+
+    def _allocate(self, state):
+        state_shape = np.shape(state)
         if self.flag_piexl:
-            self._piexl_re_processing(state, next_state)
+            obs_dtype = np.uint8
+        elif self.dtype == np.int16:
+            if self.state_bound is None:
+                from envs.airCombateEnv.customization import REGISTRY_STATE_BOUND
+                self.state_bound = REGISTRY_STATE_BOUND[args.state_setting]
+            self.scale = (np.asarray(self.state_bound, dtype=np.float32) / 32767).reshape(state_shape)
+            obs_dtype = np.int16
+        else:
+            obs_dtype = self.dtype
+        self.obs = np.empty((self.capacity,) + state_shape, dtype=obs_dtype)
+        self.linked = np.zeros(self.capacity, dtype=np.bool_)
+        for name, shape, dtype in self._columns(state_shape):
+            if name not in ("state", "next_state"):
+                setattr(self, name, np.empty(shape, dtype=dtype))
+
+    def _encode(self, state):
+        if self.flag_piexl:
+            return self._piexl_processing(state)
+        if self.scale is not None:
+            return np.clip(np.round(np.asarray(state) / self.scale), -32767, 32767)
+        return state
+
+    def _decode(self, obs):
+        if self.flag_piexl:
+            return self._piexl_rev_processing(obs)
+        if self.scale is not None:
+            return obs * self.scale
+        return obs.astype(np.float32)
+
+    def store(self, state, action, reward, next_state, done):
+        if self.obs is None:
+            self._allocate(state)
+
+        i = self.ptr
+        j = (i + 1) % self.capacity
+        if self.size == self.capacity:
+            # 覆盖最旧的样本 i，其 next_state 为样本 j 的 state
+            self.first_state.pop(i, None)
+            if self.linked[j]:
+                self.first_state[j] = self.obs[i].copy()
+                self.linked[j] = False
+        linked = self.last_next_state is not None and self.size > 0 and np.array_equal(state, self.last_next_state)
+        self.linked[i] = linked
+        if not linked:
+            self.first_state[i] = self._encode(state).astype(self.obs.dtype)
+        self.obs[i] = self._encode(next_state)
+        self.action[i] = action
+        self.reward[i] = reward
+        self.done[i] = done
+        self.last_next_state = None if done else np.array(next_state)
+        self.ptr = j
+        if self.size < self.capacity:
+            self.size += 1
+
+    # state 是否与上一个样本的 next_state 相同需要逐个判断，批量存入时逐个 store
+    store_batch = Buffer.store_batch
+    sample_into = Buffer.sample_into
+
+    def _gather(self, idx):
+        '''
+        return:
+            编码后的 state, next_state
+        '''
+        state = self.obs[idx - 1]  # idx 为 0 时取 obs[-1]，即环形数组中的上一个位置
+        for k in np.flatnonzero(~self.linked[idx]):
+            state[k] = self.first_state[idx[k]]
+        return state, self.obs[idx]
+
+    def transitions(self, idx):
+        idx = np.asarray(idx)
+        state, next_state = self._gather(idx)
+        return self._decode(state), self.action[idx], self.reward[idx], self._decode(next_state), self.done[idx]
+
+    def pop(self):
+        if self.size > 0:
+            oldest = (self.ptr - self.size) % self.capacity
+            self.first_state.pop(oldest, None)
+            nxt = (oldest + 1) % self.capacity
+            if self.size > 1 and self.linked[nxt]:
+                self.first_state[nxt] = self.obs[oldest].copy()
+                self.linked[nxt] = False
+            self.size -= 1
+
+
+class PoseReplayBuffer(CompactReplayBuffer):
+    '''
+    保存原始位姿的经验池（memory_type: pose）：
+        state / next_state 为 customization.get_pose 记录的位姿（由 common.alloc.memory_state 取出），
+        sample 时按 args.state_setting 批量计算状态（customization.get_state_from_pose），
+        因此修改 state_setting 后可以用同一份数据重新训练，不需要重新收集。
+        位姿按 CompactReplayBuffer 的方式只保存一次（float32，坐标不量化），每个样本 POSE_DIM 个数。
+    '''
+    def __init__(self, capacity, flag_piexl=0, state_setting=None):
+        super(PoseReplayBuffer, self).__init__(capacity, flag_piexl, dtype=np.float32)
+        self.state_setting = args.state_setting if state_setting is None else state_setting
+
+    def _decode(self, obs):
+        from envs.airCombateEnv.customization import get_state_from_pose
+        return get_state_from_pose(obs, self.state_setting).astype(np.float32)
+
+    def transitions(self, idx):
+        idx = np.asarray(idx)
+        pose, next_pose = self._gather(idx)
+        # state 和 next_state 一起计算
+        state = self._decode(np.concatenate([pose, next_pose]))
+        return state[:len(idx)], self.action[idx], self.reward[idx], state[len(idx):], self.done[idx]
+
+    def export(self, idx):
+        idx = np.asarray(idx)
+        pose, next_pose = self._gather(idx)
+        return pose, self.action[idx], self.reward[idx], next_pose, self.done[idx]
 
-        return state, action, reward, next_state, done
-    
 
 class SuperviseLearningBuffer(Buffer):
+    '''
+    NFSP 平均策略使用的蓄水池(reservoir)经验池：
+        未满时依次写入；写满后第 n 个样本以 capacity / n 的概率替换一个随机位置，
+        使保留的样本是全部历史样本的均匀抽样，store 为 O(1)。
+        state / action 保存在预分配的数组中（首次 store 时分配），sample 一次花式索引取出整个 batch。
+    capacity 为 None 时不限制大小（数组按 2 倍扩容，不发生替换）。
+    '''
     def __init__(self, capacity, flag_piexl=0):
         super(SuperviseLearningBuffer, self).__init__(capacity, flag_piexl)
-        self.Pair = collections.namedtuple("Pair", ["state", "action"])
+        self.state = self.action = None
+        self.size = 0
+        self.n_seen = 0  # 历史上 store 过的样本总数
+
+    def _allocate(self, state, length):
+        state_dtype = np.uint8 if self.flag_piexl else np.float32
+        new_state = np.empty((length,) + np.shape(state), dtype=state_dtype)
+        new_action = np.empty(length, dtype=np.int64)
+        if self.state is not None:
+            new_state[:self.size] = self.state[:self.size]
+            new_action[:self.size] = self.action[:self.size]
+        self.state, self.action = new_state, new_action
 
     def store(self, state, action):
-        # capacity 是 None 时，表示不设置最大储存空间
-        if self.capacity is not None:
-            if self.size > self.capacity:
-                self.replay_buffer.pop(0)
-                self._update_size()
+        if self.flag_piexl:
+            state = self._piexl_processing(state)
 
+        self.n_seen += 1
+        if self.capacity is None or self.size < self.capacity:
+            if self.state is None or self.size == len(self.state):
+                length = 1024 if self.state is None else 2 * len(self.state)
+                self._allocate(state, length if self.capacity is None else min(length, self.capacity))
+            i = self.size
+            self.size += 1
+        else:
+            i = random.randrange(self.n_seen)
+            if i >= self.capacity:
+                return
+        self.state[i] = state
+        self.action[i] = action
+
+    def store_batch(self, states, actions):
+        '''
+        批量存入：未满部分整块写入，其余样本一次抽取各自的替换位置
+        （同一位置被多次选中时保留最后一个，与逐个 store 相同）
+        '''
+        n = len(actions)
+        if n == 0:
+            return
         if self.flag_piexl:
-            self._piexl_processing(state)
+            states = self._piexl_processing(states)
+        states, actions = np.asarray(states), np.asarray(actions)
 
-        self.replay_buffer.append(self.Pair(state, action))
-        self._update_size()
+        n_fill = n if self.capacity is None else min(n, self.capacity - self.size)
+        if n_fill > 0:
+            if self.state is None or self.size + n_fill > len(self.state):
+                length = max(1024, self.size + n_fill) if self.state is None else \
+                    max(2 * len(self.state), self.size + n_fill)
+                self._allocate(states[0], length if self.capacity is None else min(length, self.capacity))
+            self.state[self.size:self.size + n_fill] = states[:n_fill]
+            self.action[self.size:self.size + n_fill] = actions[:n_fill]
+            self.size += n_fill
+        # 第 k 个样本是历史上的第 n_seen + k + 1 个样本
+        seen = self.n_seen + n_fill + 1 + np.arange(n - n_fill)
+        i = (np.random.rand(n - n_fill) * seen).astype(np.int64)
+        keep = i < self.size
+        self.state[i[keep]] = states[n_fill:][keep]
+        self.action[i[keep]] = actions[n_fill:][keep]
+        self.n_seen += n
 
     def sample(self, batch_size):
-        assert len(self.replay_buffer) > batch_size
-        batch_transition = random.sample(self.replay_buffer, batch_size)
-        state, action = map(np.array , zip(*batch_transition))
+        assert self.size > batch_size
+        idx = np.random.randint(0, self.size, batch_size)
+        state = self.state[idx]
 
         if self.flag_piexl:
-            self._piexl_re_processing(state)
+            state = self._piexl_rev_processing(state)
+
+        return state, self.action[idx]
 
-        return state, action
\ No newline at end of file
+    def pop(self):
+        if self.size > 0:
+            self.size -= 1
+
+    def __len__(self):
+        return self.size
@@ -0,0 +1,200 @@
+#!usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+多进程共享的经验池：
+    数据保存在 multiprocessing.shared_memory 中，多个 actor 进程同时写入样本，learner 进程同时采样，
+    用于将 与环境交互 和 网络训练 分到不同的进程中。
+'''
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+import sys
+sys.path.append("..")
+from memoryBuffer.replayBuffer import Buffer, ReplayBuffer
+
+
+class SharedReplayBuffer(ReplayBuffer):
+    '''
+    共享内存中的环形经验池（memory_type: shared），各列与 ReplayBuffer 相同：
+        header:     [ptr, size]，只在加锁时修改
+        seq:        每个位置的写入序号（seqlock），奇数为正在写入，0 为从未写入
+    store：
+        加锁只预留一个位置（更新 ptr、size，seq 加 1 变为奇数），解锁后再写入数据，写完后 seq 再加 1，
+        多个进程的写入互不阻塞。
+    sample：
+        加锁读取 header（ptr、size），其余与 ReplayBuffer 相同；读取前后 seq 不一致（读取时被覆盖）或未写完的位置重新抽取。
+    用法：
+        在主进程中创建（需要 state_shape，或者先 store 一个样本以确定状态形状），
+        作为 multiprocessing.Process 的参数传给子进程（使用 multiprocessing 默认的启动方式），子进程中直接 store；
+        子进程中的对象不负责释放共享内存，主进程结束时调用 close()。
+    '''
+    def __init__(self, capacity, flag_piexl=0, state_shape=None):
+        self.lock = mp.Lock()
+        self.owner = True  # 创建共享内存的进程负责 unlink
+        self.blocks = {}  # 列名: SharedMemory
+        self.state_shape = None
+        self.header = self._create("header", (2,), np.int64)
+        self.header[:] = 0
+        super(SharedReplayBuffer, self).__init__(capacity, flag_piexl)
+        self.seq = None
+        if state_shape is not None:
+            self._allocate(np.empty(state_shape))
+
+    # ptr 和 size 保存在共享内存中
+    @property
+    def ptr(self):
+        return int(self.header[0])
+
+    @ptr.setter
+    def ptr(self, value):
+        self.header[0] = value
+
+    @property
+    def size(self):
+        return int(self.header[1])
+
+    @size.setter
+    def size(self, value):
+        self.header[1] = value
+
+    def _create(self, name, shape, dtype):
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        block = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+        self.blocks[name] = block
+        return np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+    def _shared_columns(self, state_shape):
+        return self._columns(state_shape) + [("seq", (self.capacity,), np.int64)]
+
+    def _allocate(self, state):
+        self.state_shape = tuple(np.shape(state))
+        for name, shape, dtype in self._shared_columns(self.state_shape):
+            setattr(self, name, self._create(name, shape, dtype))
+        self.seq[:] = 0
+
+    def store(self, state, action, reward, next_state, done):
+        if self.state is None:
+            self._allocate(state)
+
+        if self.flag_piexl:
+            state = self._piexl_processing(state)
+            next_state = self._piexl_processing(next_state)
+
+        with self.lock:
+            i = self.ptr
+            self.ptr = (i + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+            self.seq[i] += 1
+        self.state[i] = state
+        self.action[i] = action
+        self.reward[i] = reward
+        self.next_state[i] = next_state
+        self.done[i] = done
+        self.seq[i] += 1
+
+    def store_batch(self, states, actions, rewards, next_states, dones):
+        '''
+        加锁预留连续的一段位置，解锁后整块写入（样本数超过容量时只保留最后 capacity 个）
+        '''
+        n = len(actions)
+        skip = max(n - self.capacity, 0)
+        if skip > 0:
+            states, actions, rewards, next_states, dones = \
+                [np.asarray(column)[n - self.capacity:] for column in [states, actions, rewards, next_states, dones]]
+            n = self.capacity
+        if n == 0:
+            return np.zeros(0, dtype=np.int64)
+        if self.state is None:
+            self._allocate(states[0])
+
+        if self.flag_piexl:
+            states = self._piexl_processing(states)
+            next_states = self._piexl_processing(next_states)
+
+        with self.lock:
+            i = (self.ptr + skip) % self.capacity
+            idx = (i + np.arange(n)) % self.capacity
+            self.ptr = (i + n) % self.capacity
+            self.size = min(self.size + n, self.capacity)
+            self.seq[idx] += 1
+        first = min(n, self.capacity - i)
+        for name, column in zip(["state", "action", "reward", "next_state", "done"],
+                                [states, actions, rewards, next_states, dones]):
+            data = getattr(self, name)
+            column = np.asarray(column)
+            data[i:i + first] = column[:first]
+            data[:n - first] = column[first:]
+        self.seq[idx] += 1
+        return idx
+
+    # sample 的采样方式与 ReplayBuffer 不同，sample_into 使用 sample 的结果
+    sample_into = Buffer.sample_into
+
+    def sample(self, batch_size):
+        with self.lock:  # ptr 和 size 由 store 分别修改，需要一起读取
+            ptr, size = self.ptr, self.size
+        assert size > batch_size
+        oldest = ptr - size
+        idx = (oldest + np.random.randint(0, size, batch_size)) % self.capacity
+        batch = None
+        redo = np.arange(batch_size)
+        while len(redo):
+            seq = self.seq[idx[redo]]
+            part = self.transitions(idx[redo])
+            if batch is None:
+                batch = part
+            else:
+                for column, value in zip(batch, part):
+                    column[redo] = value
+            torn = (seq % 2 == 1) | (seq == 0) | (self.seq[idx[redo]] != seq)
+            redo = redo[torn]
+            idx[redo] = (oldest + np.random.randint(0, size, len(redo))) % self.capacity
+        return batch
+
+    def pop(self):
+        with self.lock:
+            super(SharedReplayBuffer, self).pop()
+
+    def __getstate__(self):
+        '''
+        传给子进程时只传递共享内存的名字，子进程中重新映射
+        '''
+        if self.state is None:
+            raise Exception("SharedReplayBuffer: state_shape is unknown, pass state_shape or store before sharing")
+        state = {k: v for k, v in self.__dict__.items() if not isinstance(v, np.ndarray)}
+        state.pop("Transition", None)  # __init__ 中定义的 namedtuple 类不能 pickle
+        state["blocks"] = {name: block.name for name, block in self.blocks.items()}
+        state["owner"] = False
+        return state
+
+    def __setstate__(self, state):
+        names = state.pop("blocks")
+        self.__dict__.update(state)
+        self.blocks = {}
+        columns = [("header", (2,), np.int64)] + self._shared_columns(self.state_shape)
+        for name, shape, dtype in columns:
+            block = shared_memory.SharedMemory(name=names[name])
+            self.blocks[name] = block
+            setattr(self, name, np.ndarray(shape, dtype=dtype, buffer=block.buf))
+
+    def close(self):
+        '''
+        解除映射；主进程中同时释放共享内存
+        '''
+        if not self.blocks:
+            return
+        # 共享内存上的数组须先释放才能 close
+        for name in self.blocks:
+            setattr(self, name, None)
+        for block in self.blocks.values():
+            block.close()
+            if self.owner:
+                block.unlink()
+        self.blocks = {}
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
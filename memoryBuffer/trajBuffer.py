@@ -1,8 +1,113 @@
 #!usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-# 策略梯度算法使用的 经验缓存池
+'''
+按 episode 组织的经验池（n 步回报）
+'''
+import numpy as np
 import sys
 sys.path.append("..")
 #from argument.dqnArgs1 import args
-from argument.argManage import args
\ No newline at end of file
+from argument.argManage import args
+from memoryBuffer.replayBuffer import Buffer, ReplayBuffer
+
+
+class TrajBuffer(ReplayBuffer):
+    '''
+    按 episode 分段的环形经验池（memory_type: traj）：
+        样本按时间顺序连续保存在 ReplayBuffer 的各列中，另有一列 episode 编号 ep_id；
+        当上一步 done，或当前 state 与上一步 next_state 不同（换了一局或中途截断）时开始新的 episode。
+    sample：
+        对采样到的第 i 步，向后取同一 episode 内（且已写入）的至多 n_step 步，一次向量化计算
+            reward:     n 步折扣回报 sum_t gamma^t * r[i+t]
+            next_state: 最后一步的 next_state，done 为最后一步的 done
+            discount:   gamma^k（k 为实际的步数），bellman 目标为 reward + discount * max Q(next_state) * (1 - done)
+        return:
+            state, action, reward, next_state, done, discount
+    ±2 的稀疏终局奖励可以在一次更新中向前传播 n 步。
+    参数：args.n_step, args.gamma
+    '''
+    def __init__(self, capacity, flag_piexl=0, n_step=None, gamma=None):
+        super(TrajBuffer, self).__init__(capacity, flag_piexl)
+        self.n_step = args.n_step if n_step is None else n_step
+        self.gamma = args.gamma if gamma is None else gamma
+        self.gamma_pow = self.gamma ** np.arange(self.n_step + 1)
+        self.ep_id = None
+        self.n_episode = 0  # 当前 episode 的编号
+        self.last_next_state = None  # 上一次 store 的 next_state，episode 结束后为 None
+
+    def _columns(self, state_shape):
+        return super(TrajBuffer, self)._columns(state_shape) + [("ep_id", (self.capacity,), np.int64)]
+
+    def store(self, state, action, reward, next_state, done):
+        if self.last_next_state is None or not np.array_equal(state, self.last_next_state):
+            self.n_episode += 1
+        i = self.ptr
+        super(TrajBuffer, self).store(state, action, reward, next_state, done)
+        self.ep_id[i] = self.n_episode
+        self.last_next_state = None if done else np.array(next_state)
+
+    def store_batch(self, states, actions, rewards, next_states, dones):
+        '''
+        批量存入时各行视为时间上连续的样本（如一局中的一段轨迹），episode 的划分与逐个 store 相同；
+        向量化环境同一时刻的一批样本来自不同的局，应按环境分别存入。
+        '''
+        n = len(actions)
+        if n == 0:
+            return np.zeros(0, dtype=np.int64)
+        states, next_states, dones = np.asarray(states), np.asarray(next_states), np.asarray(dones)
+        new_episode = np.ones(n, dtype=np.bool_)
+        new_episode[0] = self.last_next_state is None or not np.array_equal(states[0], self.last_next_state)
+        same = (states[1:] == next_states[:-1]).all(axis=tuple(range(1, states.ndim)))
+        new_episode[1:] = ~same | (dones[:-1] != 0)
+        ep_id = self.n_episode + np.cumsum(new_episode)
+        idx = super(TrajBuffer, self).store_batch(states, actions, rewards, next_states, dones)
+        self.ep_id[idx] = ep_id[n - len(idx):]
+        self.n_episode = int(ep_id[-1])
+        self.last_next_state = None if dones[-1] else np.array(next_states[-1])
+        return idx
+
+    # sample 的采样方式与 ReplayBuffer 不同，sample_into 使用 sample 的结果
+    sample_into = Buffer.sample_into
+
+    def sample(self, batch_size):
+        assert self.size > batch_size
+        oldest = self.ptr - self.size
+        offset = np.random.randint(0, self.size, batch_size)
+        idx = (oldest + offset) % self.capacity
+
+        # (batch, n_step)：第 t 列为第 i 步之后的第 t 步
+        t = np.arange(self.n_step)
+        steps = (idx[:, None] + t) % self.capacity
+        valid = (offset[:, None] + t < self.size) & (self.ep_id[steps] == self.ep_id[idx][:, None])
+        # 遇到 done 后截断（done 的那一步仍然计入）
+        # 未写入的位置是 np.empty 分配的任意值（可能为 NaN，NaN * 0 仍为 NaN），先置 0 再计算
+        done = np.where(valid, self.done[steps], 0)
+        valid[:, 1:] &= np.cumsum(done[:, :-1], axis=1) == 0
+        k = valid.sum(axis=1)
+        reward = (np.where(valid, self.reward[steps], 0) * self.gamma_pow[:self.n_step]).sum(axis=1).astype(np.float32)
+        last = steps[np.arange(batch_size), k - 1]
+
+        state, next_state = self.state[idx], self.next_state[last]
+        if self.flag_piexl:
+            state = self._piexl_rev_processing(state)
+            next_state = self._piexl_rev_processing(next_state)
+
+        return state, self.action[idx], reward, next_state, self.done[last], \
+            self.gamma_pow[k].astype(np.float32)
+
+
+if __name__ == "__main__":
+    # 未存满的经验池中采样：未写入位置的内容不能进入 n 步回报
+    buffer = TrajBuffer(64, n_step=5, gamma=0.9)
+    for t in range(20):
+        buffer.store(np.full(3, t, np.float32), 0, 1.0, np.full(3, t + 1, np.float32), t == 19)
+    buffer.reward[20:] = np.nan
+    buffer.done[20:] = np.nan
+    for _ in range(200):
+        state, action, reward, next_state, done, discount = buffer.sample(16)
+        assert np.isfinite(reward).all() and np.isfinite(done).all()
+        k = np.round(np.log(discount) / np.log(0.9)).astype(np.int64)
+        assert np.allclose(reward, (1 - 0.9 ** k) / (1 - 0.9))
+        assert np.allclose(next_state[:, 0], np.minimum(state[:, 0] + 5, 20))
+    print("TrajBuffer: partly filled buffer ok")
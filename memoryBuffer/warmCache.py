@@ -0,0 +1,91 @@
+#!usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+经验池预热缓存：
+    run_AirCombat_selfPlay 在训练前需要先运行 args.store 局、收集 observe_step 个样本，
+    这些样本只由 环境配置、训练网络的结构（随机初始化的网络参与 egreedy 动作选择）、对手网络参数、探索策略 和 随机种子 决定。
+    以上内容的哈希作为缓存文件名，第一次运行时将收集到的样本（以及收集结束时的 epsilon）保存下来，
+    之后配置相同的运行直接载入经验池，跳过数据收集阶段。
+'''
+import hashlib
+import json
+import os
+import numpy as np
+import sys
+sys.path.append("..")
+from argument.argManage import args, param
+from common.config import cfg_from_file
+
+# 影响预热样本的探索、收集参数
+_EXPLORE_KEYS = ["initial_epsilon", "epsilon_decay_during_obser", "decay_rate", "store", "observe_step", "seed"]
+# 缓存本身的参数，不计入哈希
+_CACHE_KEYS = ["flag_warm_cache", "warm_cache_dir"]
+
+
+def _file_digest(file_path):
+    if file_path is None or not os.path.exists(file_path):
+        return "None"
+    sha = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def warm_cache_file(train_agent_name, opponent_file):
+    '''
+    param:
+        train_agent_name:   训练的智能体 'blue' 或 'red'
+        opponent_file:      对手网络参数文件（不存在时对手使用默认动作）
+    return:
+        缓存文件路径：args.warm_cache_dir/warm_<哈希>.npz
+    主要逻辑：
+        哈希内容为 环境yaml、算法yaml（net_frame、hidden_units 等）和经验池yaml（缓存本身的参数除外）中全部参数的实际取值（包括命令行修改）、
+        state_setting（pose 经验池为 'pose'）、对手参数文件内容、探索参数和随机种子
+    '''
+    env_keys = sorted(cfg_from_file('env', param['env']).keys())
+    alg_keys = sorted(cfg_from_file('algs', param['algs']).keys())
+    memory_keys = sorted(k for k in cfg_from_file('memory', param['memory']).keys() if k not in _CACHE_KEYS)
+    if args.memory_type == "pose":
+        # pose 经验池保存位姿，与 state_setting 无关
+        env_keys = [k for k in env_keys if k != "state_setting"]
+    key = {"env": {k: str(getattr(args, k)) for k in env_keys},
+           "algs": {k: str(getattr(args, k)) for k in alg_keys},
+           "memory": {k: str(getattr(args, k)) for k in memory_keys},
+           "state_setting": "pose" if args.memory_type == "pose" else args.state_setting,
+           "opponent": _file_digest(opponent_file),
+           "explore": {k: str(getattr(args, k)) for k in _EXPLORE_KEYS},
+           "train_agent_name": train_agent_name}
+    digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(args.warm_cache_dir, "warm_" + digest + ".npz")
+
+
+def save_warm_cache(file_path, agent):
+    '''
+    按时间顺序保存 agent.replay_buffer 中的全部样本和当前 epsilon
+    '''
+    buffer = agent.replay_buffer
+    idx = (buffer.ptr - buffer.size + np.arange(buffer.size)) % buffer.capacity
+    folder = os.path.dirname(file_path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    tmp_file = file_path + ".tmp.npz"
+    state, action, reward, next_state, done = buffer.export(idx)
+    np.savez(tmp_file, state=state, action=action, reward=reward, next_state=next_state, done=done,
+             epsilon=agent.epsilon)
+    os.replace(tmp_file, file_path)
+
+
+def load_warm_cache(file_path, agent):
+    '''
+    将缓存的样本批量存入 agent.replay_buffer（store_batch），并恢复收集结束时的 epsilon
+    '''
+    data = np.load(file_path)
+    state, action, reward, next_state, done = data["state"], data["action"], data["reward"], \
+        data["next_state"], data["done"]
+    # 样本按时间顺序保存，整体批量存入（traj 经验池按连续轨迹划分 episode）
+    with agent.buffer_lock:
+        agent.replay_buffer.store_batch(state, action, reward, next_state, done)
+    agent.epsilon = float(data["epsilon"])
+    return len(action)
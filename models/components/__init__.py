@@ -1,5 +1,21 @@
-from models.components.netFrame import *
+# todo: 神经网络结构需要完善
+# 只做动作选择的进程只使用 npPolicy，不导入 torch：netFrame、inference 在第一次访问以下名字时才导入
+from models.components.npPolicy import NumpyMLP, export_npz
 
-REGISTRY = {}
-REGISTRY["mlp"] = Net_MLP
-REGISTRY["cnn2mlp"] = net_frame_cnn_to_mlp
\ No newline at end of file
+
+def __getattr__(name):
+    if name == "REGISTRY":
+        from models.components.netFrame import Net_MLP, net_frame_cnn_to_mlp
+        REGISTRY = {}
+        REGISTRY["mlp"] = Net_MLP
+        REGISTRY["cnn2mlp"] = net_frame_cnn_to_mlp
+        value = REGISTRY
+    elif name in ("Net_MLP", "net_frame_cnn_to_mlp"):
+        from models.components import netFrame
+        value = getattr(netFrame, name)
+    elif name == "InferenceNet":
+        from models.components.inference import InferenceNet as value
+    else:
+        raise AttributeError("module 'models.components' has no attribute '" + name + "'")
+    globals()[name] = value
+    return value
@@ -0,0 +1,72 @@
+#!usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import copy
+import warnings
+import numpy as np
+import torch
+import sys
+sys.path.append("../..")
+
+
+class InferenceNet(object):
+    '''
+    动作选择使用的推理网络：
+        version 不为 None：使用网络的副本（eval，TorchScript trace 后 torch.jit.freeze），
+                           副本的版本与 version（原网络参数的版本）不同时从原网络重新生成，
+                           适合参数不变的 use_agent 和测试阶段；trace 失败时使用普通副本
+        version 为 None：直接使用原网络（训练中参数每一步都在变化）
+        两种方式均在 torch.inference_mode 下计算，单个状态写入缓存的输入张量，不新建张量。
+    '''
+    def __init__(self, model, state_dim, flag_trace=1):
+        self.model = model
+        self.flag_trace = flag_trace
+        self.device = next(model.parameters()).device
+        self.input = torch.zeros((1,) + tuple(np.atleast_1d(state_dim)), dtype=torch.float32)
+        self.input_np = self.input.numpy()  # 与 self.input 共享内存
+        self.net = None
+        self.version = None  # 副本对应的原网络参数版本
+
+    def sync(self, version=None):
+        '''
+        从原网络重新生成推理副本
+        '''
+        net = copy.deepcopy(self.model).eval()
+        for param in net.parameters():
+            param.requires_grad_(False)
+        if self.flag_trace:
+            try:
+                with warnings.catch_warnings(), torch.no_grad():
+                    warnings.simplefilter("ignore")  # 新版本 torch 中 jit 接口的 FutureWarning
+                    net = torch.jit.freeze(torch.jit.trace(net, self.input.to(self.device)))
+            except Exception:
+                pass
+        self.net = net
+        self.version = version
+
+    def _net(self, version):
+        if version is None:
+            return self.model
+        if self.net is None or self.version != version:
+            self.sync(version)
+        return self.net
+
+    def greedy(self, state, version=None):
+        '''
+        单个状态的最优动作
+        '''
+        self.input_np[0] = state
+        net = self._net(version)
+        with torch.inference_mode():
+            q_value = net(self.input.to(self.device))
+        return int(q_value.argmax(1))
+
+    def greedy_batch(self, states, version=None):
+        '''
+        一批状态 (N, state_dim) 的最优动作 (N,)
+        '''
+        net = self._net(version)
+        states = torch.from_numpy(np.asarray(states, dtype=np.float32)).to(self.device)
+        with torch.inference_mode():
+            q_value = net(states)
+        return q_value.argmax(1).cpu().numpy()
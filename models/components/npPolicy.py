@@ -0,0 +1,83 @@
+#!usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+不依赖 torch 的 MLP 前向计算：
+    export_npz 将 Net_MLP 的参数导出为 .npz，NumpyMLP 载入后只用 numpy 计算 Q 值，
+    用于只做动作选择的进程（固定的对手 use_agent、评估），这些进程不需要导入 torch。
+    本文件只导入 numpy（argument.argManage 会导入 torch，这里不使用 args）。
+'''
+import os
+import numpy as np
+
+
+def export_npz(model, file_path, dtype=np.float32):
+    '''
+    param:
+        model:      Net_MLP（或其 state_dict），全连接层之间为 ReLU
+        file_path:  保存的 .npz 文件
+        dtype:      保存的精度，np.float16 时文件大小减半（载入后按 float32 计算）
+    主要逻辑：
+        按顺序取出各全连接层的 weight (out, in) 和 bias，weight 转置为 (in, out) 保存为 w0, b0, w1, b1, ...
+    '''
+    state_dict = model.state_dict() if hasattr(model, "state_dict") else model
+    weights = {}
+    n_layer = 0
+    for name, value in state_dict.items():
+        if not name.endswith(".weight"):
+            continue
+        weight = value.detach().cpu().numpy()
+        bias = state_dict[name[:-len("weight")] + "bias"].detach().cpu().numpy()
+        weights["w" + str(n_layer)] = np.ascontiguousarray(weight.T, dtype=dtype)
+        weights["b" + str(n_layer)] = bias.astype(dtype)
+        n_layer += 1
+    folder = os.path.dirname(file_path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    np.savez(file_path, **weights)
+
+
+class NumpyMLP(object):
+    '''
+    用法与 DQN 的 max_action、max_action_batch 相同：
+        policy = NumpyMLP(file_path)
+        action = policy.max_action(state)
+        actions = policy.max_action_batch(states)
+    参数文件不存在时与 DQN 相同，始终选择默认动作 2。
+    '''
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.weights = []
+        self.bool_defaule_action = False
+        if os.path.exists(file_path):
+            with np.load(file_path) as data:
+                n_layer = len(data.files) // 2
+                self.weights = [(data["w" + str(i)].astype(np.float32), data["b" + str(i)].astype(np.float32))
+                                for i in range(n_layer)]
+            print("\n\n\n=======Successfully loaded:" + file_path + "========")
+        else:
+            print("\n\n\n ========== LoadNone: default action for use_agent ===============")
+            print("Could not find " + file_path + ", the agent will keep choosing default_action = 2 in [0,1,2]")
+            self.bool_defaule_action = True
+
+    def forward(self, states):
+        '''
+        states: (state_dim,) 或 (N, state_dim)，返回对应的 Q 值
+        '''
+        x = np.asarray(states, dtype=np.float32)
+        for i, (weight, bias) in enumerate(self.weights):
+            x = np.dot(x, weight)
+            x += bias
+            if i < len(self.weights) - 1:
+                np.maximum(x, 0, out=x)
+        return x
+
+    def max_action(self, state):
+        if self.bool_defaule_action:
+            return 2
+        return int(self.forward(state).argmax())
+
+    def max_action_batch(self, states):
+        if self.bool_defaule_action:
+            return np.full(len(states), 2, dtype=np.int64)
+        return self.forward(states).argmax(axis=-1)
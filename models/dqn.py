@@ -10,9 +10,13 @@ from collections import deque
 import os
 import random
 import sys
+import threading
 sys.path.append("..")
 from memoryBuffer.replayBuffer import ReplayBuffer, SuperviseLearningBuffer
+from memoryBuffer import REGISTRY as registry_buffer
+from memoryBuffer.prefetcher import Prefetcher
 from models.components import REGISTRY as registry_net_frame
+from models.components import InferenceNet, export_npz
 import common.utlis as U
 #from argument.dqnArgs import args
 from argument.argManage import args
@@ -25,15 +29,94 @@ if 'cnn' in args.net_frame:
 
 
 class DQNBase(object):
-    def __init__(self, state_dim, n_action):
-        self.replay_buffer = ReplayBuffer(args.replay_size)
+    def __init__(self, state_dim, n_action, scope=None):
+        if args.memory_type == "memmap":
+            # 每个智能体的 memmap 经验池使用各自的文件夹，重新运行时按 scope 找回
+            self.replay_buffer = registry_buffer[args.memory_type](
+                args.replay_size, path=os.path.join(args.save_path, args.memmap_dir, str(scope)))
+        else:
+            self.replay_buffer = registry_buffer[args.memory_type](args.replay_size)
+        self.prioritized = args.memory_type == "prioritized"  # 优先经验回放时 sample 额外返回 权重 和 样本序号
+        self.n_step = args.memory_type == "traj"  # n 步回报时 sample 额外返回 每个样本的折扣
+        self.buffer_lock = threading.Lock()  # 后台预取（args.n_prefetch > 0）时，经验池的写入与采样互斥
+        self.prefetcher = None
+        self.staging = None  # 训练 batch 的暂存数组，见 _allocate_staging
         self.epsilon = args.initial_epsilon
         self.state_dim = state_dim
         self.n_action = n_action
+        self.param_version = 0  # 网络参数的版本，训练或载入参数时加 1，推理网络（InferenceNet）据此重新同步
 
     def load_parms(self):
         raise NotImplementedError
 
+    def _td_loss(self, td_error, batch):
+        '''
+        均方TD误差；优先经验回放时乘以重要性采样权重，并用 |TD误差| 更新样本优先级
+        '''
+        if not self.prioritized:
+            return td_error.pow(2).mean()
+        weights, idx = batch[5], batch[6]
+        with self.buffer_lock:
+            self.replay_buffer.update_priorities(idx, td_error.detach().cpu().numpy())
+        return (U.Variable(torch.FloatTensor(weights)) * td_error.pow(2)).mean()
+
+    def _next_batch(self):
+        '''
+        从 self.replay_buffer 中取一个训练 batch
+        return:
+            state, action, reward, next_state, done 的张量，以及 sample 的原始返回值
+        主要逻辑：
+            args.n_prefetch > 0 时由后台线程提前采样并转换为张量（第一次调用时启动），
+            否则经验池直接写入暂存数组，返回与之共享内存的张量（每次训练不分配新的张量）
+        '''
+        assert len(self.replay_buffer) >= args.batch_size
+        if args.n_prefetch > 0:
+            if self.prefetcher is None:
+                self.prefetcher = Prefetcher(self.replay_buffer, args.batch_size, args.n_prefetch, self.buffer_lock)
+            tensors, batch = next(self.prefetcher)
+            return tuple(tensors) + (batch,)
+
+        if self.staging is None:
+            self._allocate_staging()
+        extra = self.replay_buffer.sample_into(args.batch_size, self.staging)
+        if U.is_cuda():
+            for tensor, host in zip(self.staging_device, self.staging_tensors):
+                tensor.copy_(host)
+        return tuple(self.staging_device) + (tuple(self.staging) + extra,)
+
+    def _allocate_staging(self):
+        '''
+        训练 batch 的暂存数组（state, action, reward, next_state, done），每次训练由经验池直接写入：
+            self.staging_tensors 为 torch 张量（有 GPU 时为 pinned memory），self.staging 为共享同一内存的 numpy 数组，
+            self.staging_device 为网络使用的张量（有 GPU 时为 GPU 上的拷贝，否则即 staging_tensors）
+        '''
+        state_shape = (args.batch_size,) + tuple(np.atleast_1d(self.state_dim))
+        shapes = [(state_shape, torch.float32), ((args.batch_size,), torch.int64), ((args.batch_size,), torch.float32),
+                  (state_shape, torch.float32), ((args.batch_size,), torch.float32)]
+        self.staging_tensors = [torch.empty(shape, dtype=dtype, pin_memory=U.is_cuda()) for shape, dtype in shapes]
+        self.staging = [tensor.numpy() for tensor in self.staging_tensors]
+        self.staging_device = [tensor.cuda() for tensor in self.staging_tensors] if U.is_cuda() \
+            else self.staging_tensors
+
+    def _discount(self, batch):
+        '''
+        bellman 目标中 下一状态Q值 的折扣：n 步回报时为每个样本的 gamma^k，否则为 gamma
+        '''
+        if not self.n_step:
+            return self.gamma
+        return U.Variable(torch.FloatTensor(batch[5]))
+
+    def _decay_epsilon(self, step, n=1):
+        '''
+        与逐个决策相同地递减 n 次 epsilon：大于 0.1 时每次减 step，否则每次乘以 args.decay_rate
+        '''
+        n_linear = min(n, max(0, int(np.ceil((self.epsilon - 0.1) / step))))
+        self.epsilon = (self.epsilon - n_linear * step) * args.decay_rate ** (n - n_linear)
+
+    def _actor_version(self):
+        # 训练时网络参数每一步都在变化，直接使用原网络；否则使用冻结的副本
+        return None if self.is_train else self.param_version
+
     def create_training_method(self):
         raise NotImplementedError
 
@@ -55,7 +138,7 @@ class DQNBase(object):
 
 class DQN(DQNBase):
     def __init__(self, state_dim, n_action, is_train=False, is_based=False, scope=None):
-        super(DQN2013, self).__init__(state_dim, n_action)
+        super(DQN, self).__init__(state_dim, n_action, scope)
         self.scope = scope
 
         self.is_train = is_train
@@ -83,6 +166,8 @@ class DQN(DQNBase):
         
         self.optimizer = optim.Adam(self.model.parameters(), lr=self.learning_rate)
         self._load_parms()
+        # 动作选择：训练时使用训练中的网络，否则 max_action 使用冻结的副本（flag_infer_trace=1 时 trace）
+        self.actor = InferenceNet(self.model, self.state_dim, args.flag_infer_trace)
         
         
     def _load_parms(self):
@@ -98,6 +183,7 @@ class DQN(DQNBase):
             file_path = self.save_path + "/" + self.checkpoint_folder_name+"/" + self.scope + self.file_name
             if os.path.exists(file_path):
                 self.model.load_state_dict(torch.load(file_path))
+                self.param_version += 1
                 print("\n\n\n=======Successfully loaded:" + file_path + "========")
             else:
                 print("\n\n\n ========== LoadNone: default action for use_agent ===============")
@@ -107,44 +193,52 @@ class DQN(DQNBase):
                 
 
     def train(self):
-        assert len(self.replay_buffer) >= args.batch_size
-        state, action, reward, next_state, done = self.replay_buffer.sample(args.batch_size)
-
-        state      = U.Variable(torch.FloatTensor(state.astype(np.float32)))
-        next_state = U.Variable(torch.FloatTensor(next_state.astype(np.float32)))
-        action     = U.Variable(torch.LongTensor(action))
-        reward     = U.Variable(torch.FloatTensor(reward))
-        done       = U.Variable(torch.FloatTensor(done))
+        state, action, reward, next_state, done, batch = self._next_batch()
 
         q_values      = self.model(state)
         next_q_values = self.target_model(next_state) if self.flag_target_net else self.model(next_state)
 
         q_value          = q_values.gather(1, action.unsqueeze(1)).squeeze(1)
         next_q_value_max = next_q_values.max(1)[0]
-        bellman_target = reward + self.gamma * next_q_value_max * (1 - done)
+        bellman_target = reward + self._discount(batch) * next_q_value_max * (1 - done)
         
-        loss = (q_value - U.Variable(bellman_target.detach())).pow(2).mean()            
+        loss = self._td_loss(q_value - U.Variable(bellman_target.detach()), batch)
         self.optimizer.zero_grad()
         loss.backward()
         self.optimizer.step()
+        self.param_version += 1
 
     def update_target_net(self):
         assert self.flag_target_net
         self.target_model.load_state_dict(self.model.state_dict())
+        self.actor.sync(self.param_version)
         print("updating target network...")
 
     def perceive(self, state, action, reward, next_state, done):
-        self.replay_buffer.store(state, action, reward,
-                                   next_state, done)
-        if len(self.replay_buffer) > args.replay_size:
-            self.replay_buffer.pop()
+        with self.buffer_lock:
+            self.replay_buffer.store(state, action, reward,
+                                       next_state, done)
         if len(self.replay_buffer) > args.batch_size:
             self.train()
 
     def store_data(self, state, action, reward, next_state, done):
-        if len(self.replay_buffer) > args.replay_size:
-            self.replay_buffer.pop()
-        self.replay_buffer.store(state, action, reward, next_state, done)
+        with self.buffer_lock:
+            self.replay_buffer.store(state, action, reward, next_state, done)
+
+    def perceive_batch(self, states, action, reward, next_states, done):
+        '''
+        批量版本的 perceive（如向量化环境每一步的全部样本）：整块存入经验池，
+        每个样本训练一次，与逐个 perceive 的训练次数相同
+        '''
+        with self.buffer_lock:
+            self.replay_buffer.store_batch(states, action, reward, next_states, done)
+        if len(self.replay_buffer) > args.batch_size:
+            for _ in range(len(action)):
+                self.train()
+
+    def store_data_batch(self, states, action, reward, next_states, done):
+        with self.buffer_lock:
+            self.replay_buffer.store_batch(states, action, reward, next_states, done)
 
     def egreedy_action(self, state, epsilon_decay=1):
         if epsilon_decay:
@@ -154,12 +248,7 @@ class DQN(DQNBase):
                 self.epsilon = self.epsilon * args.decay_rate
 
         if random.random() > self.epsilon:
-            state   = U.Variable(torch.FloatTensor(state.astype(np.float32)).unsqueeze(0))
-            q_value = self.model(state)
-            action_max_value, index = torch.max(q_value, 1)
-            action = index.item()
-            # action  = q_value.max(1)[1].data[0]
-#             print(action)
+            action = self.actor.greedy(state)
         else:
             action = random.randrange(self.n_action)
         return action
@@ -168,32 +257,56 @@ class DQN(DQNBase):
         if self.bool_defaule_action:
             return 2
         else:
-            state   = U.Variable(torch.FloatTensor(state.astype(np.float32)).unsqueeze(0))
-            q_value = self.model(state)
-            action_max_value, index = torch.max(q_value, 1)
-            action = index.item()
-            return action
+            return self.actor.greedy(state, self._actor_version())
+
+    def egreedy_action_batch(self, states, epsilon_decay=1):
+        '''
+        egreedy_action 的批量版本（如向量化环境）：
+            states 为 (N, state_dim)，返回 N 个动作；每行独立地以 epsilon 概率随机动作（一次生成 N 个随机数），
+            其余行一次前向计算；epsilon 的递减次数与逐个调用 N 次相同
+        '''
+        n = len(states)
+        if epsilon_decay:
+            self._decay_epsilon(0.000005, n)
+
+        action = np.random.randint(self.n_action, size=n)
+        greedy = np.random.rand(n) > self.epsilon
+        if greedy.any():
+            action[greedy] = self.actor.greedy_batch(np.asarray(states)[greedy])
+        return action
+
+    def max_action_batch(self, states):
+        if self.bool_defaule_action:
+            return np.full(len(states), 2, dtype=np.int64)
+        return self.actor.greedy_batch(states, self._actor_version())
 
     def save_model(self, iter_num=None):
         if not os.path.exists(self.save_path):
             os.makedirs(self.save_path)
         if iter_num is None:
-            torch.save(self.model.state_dict(), self.save_path + "/" + self.checkpoint_folder_name+"/" + self.scope + self.file_name)
+            file_path = self.save_path + "/" + self.checkpoint_folder_name+"/" + self.scope + self.file_name
         else:
-            torch.save(self.model.state_dict(), self.save_path + "/" + self.checkpoint_folder_name+"/" + str(iter_num) + self.scope + self.file_name)
+            file_path = self.save_path + "/" + self.checkpoint_folder_name+"/" + str(iter_num) + self.scope + self.file_name
+        torch.save(self.model.state_dict(), file_path)
+        if args.flag_export_npz:
+            # 同时导出 numpy 参数，供不导入 torch 的进程使用（NumpyMLP）
+            export_npz(self.model, file_path + ".npz")
+        self.actor.sync(self.param_version)
 
 
 class DQN4NFSP(DQNBase):
     def __init__(self, state_dim, action_dim, scope, is_train=1, is_based=0):
-        super(DQN4NFSP, self).__init__(state_dim, action_dim)
+        super(DQN4NFSP, self).__init__(state_dim, action_dim, scope)
         self.buffer_rl = self.replay_buffer                         # 强化学习使用的buffer，简单的对rl_buffer对象进行重命名
-        self.buffer_sl = SuperviseLearningBuffer(100000) # 监督学习使用的buffer    args.sl_size
+        self.buffer_sl = SuperviseLearningBuffer(args.sl_size)  # 监督学习使用的buffer（蓄水池采样）
         self.scope = scope
 
         self.is_train = is_train
         self.is_based = is_based
         self.flag_target_net = args.flag_target_net     # 是否使用 target_network （2013 or 2015）
 
+        self.bool_defaule_action = False
+
         self.gamma = args.gamma
         self.learning_rate_rl = 0.0005
         self.learning_rate_sl = 0.001
@@ -223,6 +336,9 @@ class DQN4NFSP(DQNBase):
         self.optimizer_rl = optim.Adam(self.model_rl.parameters(), lr=self.learning_rate_rl)
         self.optimizer_sl = optim.Adam(self.model_sl.parameters(), lr=self.learning_rate_sl)
         self._load_parms()
+        # 动作选择：训练时使用训练中的网络，否则使用冻结的副本（flag_infer_trace=1 时 trace）
+        self.actor_rl = InferenceNet(self.model_rl, self.state_dim, args.flag_infer_trace)
+        self.actor_sl = InferenceNet(self.model_sl, self.state_dim, args.flag_infer_trace)
         
         
     def _load_parms(self, iter_num=None):
@@ -236,6 +352,7 @@ class DQN4NFSP(DQNBase):
             checkpoint = torch.load(file_path)
             self.model_rl.load_state_dict(checkpoint["model_rl"])
             self.model_sl.load_state_dict(checkpoint["model_sl"])
+            self.param_version += 1
             # self.target_model_rl.load_state_dict(checkpoint["target_model_rl"])
             print("\n\n\n=======Successfully loaded:" + file_path + "========")
         else:
@@ -257,16 +374,11 @@ class DQN4NFSP(DQNBase):
                         'model_sl': self.model_sl.state_dict()}, \
                         # 'target_model_rl': self.target_model_rl.state_dict()}, \
                 self.save_path + str(iter_num) + self.scope + self.file_name)
+        self.actor_rl.sync(self.param_version)
+        self.actor_sl.sync(self.param_version)
                 
     def train_rl(self):
-        assert len(self.buffer_rl) >= args.batch_size
-        state, action, reward, next_state, done = self.buffer_rl.sample(args.batch_size)
-
-        state      = U.Variable(torch.FloatTensor(state.astype(np.float32)))
-        next_state = U.Variable(torch.FloatTensor(next_state.astype(np.float32)))
-        action     = U.Variable(torch.LongTensor(action))
-        reward     = U.Variable(torch.FloatTensor(reward))
-        done       = U.Variable(torch.FloatTensor(done))
+        state, action, reward, next_state, done, batch = self._next_batch()
 
         q_values   = self.model_rl(state)
         if self.flag_target_net:
@@ -276,12 +388,13 @@ class DQN4NFSP(DQNBase):
 
         q_value          = q_values.gather(1, action.unsqueeze(1)).squeeze(1)
         next_q_value_max = next_q_values.max(1)[0]
-        expected_q_value = reward + self.gamma * next_q_value_max * (1 - done)
+        expected_q_value = reward + self._discount(batch) * next_q_value_max * (1 - done)
         
-        loss_rl = (q_value - U.Variable(expected_q_value.detach())).pow(2).mean()            
+        loss_rl = self._td_loss(q_value - U.Variable(expected_q_value.detach()), batch)
         self.optimizer_rl.zero_grad()
         loss_rl.backward()
         self.optimizer_rl.step()
+        self.param_version += 1
 
     def train_sl(self):
         assert len(self.buffer_sl) >= args.batch_size
@@ -298,18 +411,28 @@ class DQN4NFSP(DQNBase):
         self.optimizer_sl.zero_grad()
         loss_sl.backward()
         self.optimizer_sl.step()
+        self.param_version += 1
 
     def update_target_net(self):
         assert self.flag_target_net
         self.target_model_rl.load_state_dict(self.model_rl.state_dict())
+        self.actor_rl.sync(self.param_version)
         print("update target network")
 
     def store_data_rl(self, state, action, reward, next_state, done):
-        self.buffer_rl.store(state, action, reward, next_state, done)
+        with self.buffer_lock:
+            self.buffer_rl.store(state, action, reward, next_state, done)
 
     def store_data_sl(self, state, action):
         self.buffer_sl.store(state, action)    
 
+    def store_data_rl_batch(self, states, action, reward, next_states, done):
+        with self.buffer_lock:
+            self.buffer_rl.store_batch(states, action, reward, next_states, done)
+
+    def store_data_sl_batch(self, states, action):
+        self.buffer_sl.store_batch(states, action)
+
     def NFSP_action(self, state, epsilon_decay=1, eta_decay=0):
         '''
         Param:
@@ -332,16 +455,51 @@ class DQN4NFSP(DQNBase):
                 action = random.randrange(self.n_action)
         return action, is_best_response
 
+    def NFSP_action_batch(self, states, epsilon_decay=1, eta_decay=0):
+        '''
+        NFSP_action 的批量版本：states 为 (N, state_dim)
+        return:
+            N 个动作，以及每行是否为 best_response (N,) bool
+        主要逻辑：
+            一次生成 (N,2) 个随机数，每行独立地判断 eta（best_response 或 average_stargiey）和 epsilon，
+            两个网络各一次前向计算；epsilon 的递减次数与逐个调用 N 次相同
+        '''
+        n = len(states)
+        states = np.asarray(states)
+        if epsilon_decay:
+            self._decay_epsilon(0.00005, n)
+
+        rand = np.random.rand(n, 2)
+        is_best_response = rand[:, 0] <= self.eta
+        action = np.random.randint(self.n_action, size=n)
+        average = ~is_best_response
+        if average.any():
+            action[average] = self.average_stargiey_batch(states[average])
+        greedy = is_best_response & (rand[:, 1] > self.epsilon)
+        if greedy.any():
+            action[greedy] = self.best_response_batch(states[greedy])
+        return action, is_best_response
+
+    def best_response_batch(self, states):
+        if self._use_default_action():
+            return np.full(len(states), 2, dtype=np.int64)
+        return self.actor_rl.greedy_batch(states, self._actor_version())
+
+    def average_stargiey_batch(self, states):
+        if self._use_default_action():
+            return np.full(len(states), 2, dtype=np.int64)
+        return self.actor_sl.greedy_batch(states, self._actor_version())
+
+    def _use_default_action(self):
+        # 没有载入网络参数、且不在训练时，始终选择默认动作 2（训练时从随机初始化的网络开始学习）
+        return self.bool_defaule_action and not self.is_train
+
     def best_response(self, state):
-        state   = U.Variable(torch.FloatTensor(state.astype(np.float32)).unsqueeze(0))
-        q_value = self.model_rl(state)
-        action_max_value, index = torch.max(q_value, 1)
-        action = index.item()
-        return action
+        if self._use_default_action():
+            return 2
+        return self.actor_rl.greedy(state, self._actor_version())
 
     def average_stargiey(self, state):
-        state   = U.Variable(torch.FloatTensor(state.astype(np.float32)).unsqueeze(0))
-        logits = self.model_sl(state)
-        action_max_value, index = torch.max(logits, 1)
-        action = index.item()
-        return action
\ No newline at end of file
+        if self._use_default_action():
+            return 2
+        return self.actor_sl.greedy(state, self._actor_version())
\ No newline at end of file